@@ -0,0 +1,34 @@
+from django.db import transaction
+from core.cache import (
+    CATALOG, bump_cache_generation, get_cache_generation
+)
+
+
+def _cart_namespace(cart_id):
+    return f"cart:{cart_id}"
+
+
+def get_cart_version(cart_id):
+    """Return the current version of a cart's cached payload and totals"""
+    return get_cache_generation(_cart_namespace(cart_id))
+
+
+def bump_cart_version(cart_id):
+    """Retire everything cached for a cart once the current write commits.
+
+    Bumping after commit keeps a concurrent read from caching rows that are
+    about to change under the new version.
+    """
+    transaction.on_commit(
+        lambda: bump_cache_generation(_cart_namespace(cart_id)))
+
+
+def get_cart_cache_key(cart_id):
+    # Prices are part of the payload, so catalog writes retire it too
+    return (f"cart:{cart_id}:{get_cart_version(cart_id)}:"
+            f"{get_cache_generation(CATALOG)}")
+
+
+def get_cart_totals_cache_key(cart_id):
+    return (f"cart_totals:{cart_id}:{get_cart_version(cart_id)}:"
+            f"{get_cache_generation(CATALOG)}")
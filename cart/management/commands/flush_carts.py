@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from cart.models import Cart
+from cart.stores import get_cart_store
+
+
+class Command(BaseCommand):
+    help = "Write carts changed in the cart store through to CartItem rows."
+
+    def handle(self, *args, **options):
+        store = get_cart_store()
+        if not hasattr(store, 'dirty_cart_ids'):
+            self.stdout.write("The cart store writes rows directly.")
+            return
+
+        carts = Cart.objects.filter(pk__in=store.dirty_cart_ids())
+        flushed = 0
+        for cart in carts.iterator():
+            store.flush(cart)
+            flushed += 1
+        self.stdout.write(self.style.SUCCESS(f"Flushed {flushed} carts."))
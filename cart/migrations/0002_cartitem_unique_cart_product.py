@@ -0,0 +1,34 @@
+# Generated by Django 4.2.19 on 2026-10-18 14:05
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_items(apps, schema_editor):
+    """Fold repeated (cart, product) lines into one so the constraint holds"""
+    CartItem = apps.get_model('cart', 'CartItem')
+    duplicates = CartItem.objects.values('cart_id', 'product_id').annotate(
+        lines=Count('id'), total=Sum('quantity')).filter(lines__gt=1)
+
+    for duplicate in duplicates:
+        items = CartItem.objects.filter(
+            cart_id=duplicate['cart_id'],
+            product_id=duplicate['product_id']).order_by('created_at', 'id')
+        keep = items.first()
+        items.exclude(pk=keep.pk).delete()
+        CartItem.objects.filter(pk=keep.pk).update(quantity=duplicate['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='unique_cart_product'),
+        ),
+    ]
@@ -1,7 +1,13 @@
 from django.db import models
-from products.models import Product
+from products.models import Product, main_images_prefetch
 from users.models import User
 
+class CartItemQuerySet(models.QuerySet):
+    def with_products(self):
+        """Load each item's product and its main image in two queries"""
+        return self.select_related('product').prefetch_related(
+            main_images_prefetch('product__product_images'))
+
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
     updated_at = models.DateTimeField(auto_now=True)
@@ -19,9 +25,15 @@ class CartItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CartItemQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in {self.cart.user.username}'s cart"
 
     class Meta:
         verbose_name = "Cart Item"
-        verbose_name_plural = "Cart Items"
\ No newline at end of file
+        verbose_name_plural = "Cart Items"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['cart', 'product'], name='unique_cart_product'),
+        ]
\ No newline at end of file
@@ -19,23 +19,44 @@ class ProductCartSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'brand', 'price', 'image', 'quantity']
 
     def get_image(self, obj):
-        main_image = obj.product.product_images.filter(is_main=True).first()
+        # Items from the cart store's get_items() carry main_images
+        main_images = getattr(obj.product, 'main_images', None)
+        if main_images is None:
+            main_images = obj.product.product_images.filter(is_main=True)[:1]
+        main_image = main_images[0] if main_images else None
         return main_image.image.url if main_image and main_image.image else None
 
 
+class CartTotalsSerializer(serializers.Serializer):
+    itemCount = serializers.IntegerField(source='item_count')
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2)
+    discount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    total = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
 class CartSerializer(serializers.ModelSerializer):
     userId = serializers.UUIDField(source='user.id', read_only=True)
     products = serializers.SerializerMethodField()
+    totals = serializers.SerializerMethodField()
     updatedAt = serializers.DateTimeField(source='updated_at')
 
     class Meta:
         model = Cart
-        fields = ['userId', 'products', 'updatedAt']
+        fields = ['userId', 'products', 'totals', 'updatedAt']
 
     def get_products(self, obj):
-        cart_items = obj.items.all()
+        # Cart stores pass the items they loaded; otherwise read the rows
+        cart_items = self.context.get('items')
+        if cart_items is None:
+            cart_items = obj.items.all()
         return ProductCartSerializer(cart_items, many=True).data
 
+    def get_totals(self, obj):
+        totals = self.context.get('totals')
+        if totals is None:
+            return None
+        return CartTotalsSerializer(totals).data
+
 
 class AddToCartSerializer(serializers.Serializer):
     product_id = serializers.UUIDField()
@@ -47,14 +68,11 @@ class AddToCartSerializer(serializers.Serializer):
         return value
 
 
-class CartItemUpdateSerializer(serializers.ModelSerializer):
+class CartItemUpdateSerializer(serializers.Serializer):
+    """Validate a change to the cart line for `product_id` in the context"""
     quantity = serializers.IntegerField(min_value=0, required=False)
     product_id = serializers.UUIDField(required=False)
 
-    class Meta:
-        model = CartItem
-        fields = ['quantity', 'product_id']
-
     def validate(self, data):
         quantity = data.get('quantity')
         product_id = data.get('product_id')
@@ -66,30 +84,43 @@ class CartItemUpdateSerializer(serializers.ModelSerializer):
         if product_id is not None:
             if not Product.objects.filter(id=product_id).exists():
                 raise serializers.ValidationError("Product does not exist.")
-            cart = self.instance.cart
-            if CartItem.objects.filter(cart=cart, product_id=product_id).exclude(pk=self.instance.pk).exists():
+            store = self.context['store']
+            cart = self.context['cart']
+            if (product_id != self.context['product_id']
+                    and store.contains(cart, product_id)):
                 raise serializers.ValidationError(
                     "This product is already in the cart.")
 
         return data
 
-    def update(self, instance, validated_data):
-        quantity = validated_data.get('quantity')
-        product_id = validated_data.get('product_id')
 
-        # Handle quantity zero or negative by deleting the item
-        if quantity is not None and quantity <= 0:
-            instance.delete()
-            return instance
+class CartOperationSerializer(serializers.Serializer):
+    ADD, SET, REMOVE = 'add', 'set', 'remove'
 
-        # Update product if provided
-        if product_id is not None:
-            product = Product.objects.get(id=product_id)
-            instance.product = product
+    op = serializers.ChoiceField(choices=[ADD, SET, REMOVE])
+    product_id = serializers.UUIDField()
+    quantity = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, data):
+        quantity = data.get('quantity')
+        if data['op'] == self.ADD and not quantity:
+            raise serializers.ValidationError(
+                "'add' needs a quantity of at least 1.")
+        if data['op'] == self.SET and quantity is None:
+            raise serializers.ValidationError("'set' needs a quantity.")
+        return data
 
-        # Update quantity if provided
-        if quantity is not None:
-            instance.quantity = quantity
 
-        instance.save()
-        return instance
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(
+        many=True, allow_empty=False, max_length=100)
+
+    def validate_operations(self, operations):
+        product_ids = {operation['product_id'] for operation in operations}
+        found = set(Product.objects.filter(
+            id__in=product_ids).values_list('id', flat=True))
+        missing = product_ids - found
+        if missing:
+            raise serializers.ValidationError(
+                f"Products do not exist: {', '.join(sorted(map(str, missing)))}.")
+        return operations
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .cache import bump_cart_version
+from .models import CartItem
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def bump_cart_item_cart_version(sender, instance, **kwargs):
+    bump_cart_version(instance.cart_id)
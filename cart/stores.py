@@ -0,0 +1,413 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from products.models import Product, main_images_prefetch
+from .cache import bump_cart_version, get_cart_totals_cache_key
+from .models import CartItem
+from .totals import aggregate_cart_lines
+
+def resolve_operations(quantities, operations):
+    """
+    Apply add/set/remove operations in order to {product_id: quantity}.
+
+    Returns the final quantity of every product the operations touched, with
+    0 meaning the line is removed.
+    """
+    resolved = {}
+    for operation in operations:
+        product_id = str(operation['product_id'])
+        current = resolved.get(product_id, quantities.get(product_id, 0))
+        if operation['op'] == 'add':
+            resolved[product_id] = current + operation['quantity']
+        elif operation['op'] == 'set':
+            resolved[product_id] = operation['quantity']
+        else:
+            resolved[product_id] = 0
+    return resolved
+
+
+# Backends with INSERT ... ON CONFLICT DO UPDATE and DELETE ... RETURNING
+UPSERT_VENDORS = ('postgresql', 'sqlite')
+
+
+def delete_cart_rows(cart):
+    """
+    Delete every line of a cart with one DELETE, returning their product ids.
+
+    QuerySet.delete() would select the lines first and delete them in chunks
+    for the CartItem signals, so the cart version is bumped here instead.
+    """
+    opts = CartItem._meta
+    qn = connection.ops.quote_name
+    product_field = opts.get_field('product')
+    sql = (f"DELETE FROM {qn(opts.db_table)} "
+           f"WHERE {qn(opts.get_field('cart').column)} = %s")
+
+    if connection.vendor in UPSERT_VENDORS:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"{sql} RETURNING {qn(product_field.column)}", [cart.pk])
+            product_ids = [
+                product_field.to_python(row[0]) for row in cursor.fetchall()]
+    else:
+        product_ids = list(CartItem.objects.filter(
+            cart=cart).values_list('product_id', flat=True))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [cart.pk])
+    bump_cart_version(cart.pk)
+    return product_ids
+
+
+class DatabaseCartStore:
+    """Carts kept as CartItem rows, the default store"""
+
+    def get_items(self, cart):
+        """Return the cart's items with products and main images loaded"""
+        return list(CartItem.objects.filter(cart=cart).with_products())
+
+    def totals(self, cart):
+        return aggregate_cart_lines(
+            CartItem.objects.filter(cart=cart), F('quantity'), 'product__')
+
+    def contains(self, cart, product_id):
+        return CartItem.objects.filter(cart=cart, product_id=product_id).exists()
+
+    def add(self, cart, product_id, quantity):
+        """
+        Add `quantity` of a product, returning True if it is a new line.
+
+        On Postgres and SQLite this is a single INSERT ... ON CONFLICT DO
+        UPDATE against the (cart, product) constraint, so concurrent adds
+        increment the same row instead of overwriting each other.
+        """
+        if connection.vendor in UPSERT_VENDORS:
+            new_quantity, = self._upsert(cart, {product_id: quantity}).values()
+            created = new_quantity == quantity
+        else:
+            created = self._update_or_create(cart, product_id, quantity)
+        # Neither the upsert nor the update sends CartItem signals
+        bump_cart_version(cart.pk)
+        return created
+
+    def _update_or_create(self, cart, product_id, quantity):
+        lines = CartItem.objects.filter(cart=cart, product_id=product_id)
+        if lines.update(quantity=F('quantity') + quantity):
+            return False
+        try:
+            with transaction.atomic():
+                CartItem.objects.create(
+                    cart=cart, product_id=product_id, quantity=quantity)
+            return True
+        except IntegrityError:
+            # Lost the insert race; the other request's row exists now
+            lines.update(quantity=F('quantity') + quantity)
+            return False
+
+    def _upsert(self, cart, quantities):
+        """
+        Add {product_id: quantity} to the cart's lines with one INSERT ...
+        ON CONFLICT DO UPDATE, returning the new quantities by product id.
+        """
+        opts = CartItem._meta
+        qn = connection.ops.quote_name
+        table = qn(opts.db_table)
+        product_field = opts.get_field('product')
+        columns = {
+            name: qn(opts.get_field(name).column)
+            for name in ('cart', 'product', 'quantity', 'created_at')
+        }
+        values_sql = ', '.join(['(%s, %s, %s, %s)'] * len(quantities))
+        sql = (
+            f"INSERT INTO {table} ({columns['cart']}, {columns['product']}, "
+            f"{columns['quantity']}, {columns['created_at']}) "
+            f"VALUES {values_sql} "
+            f"ON CONFLICT ({columns['cart']}, {columns['product']}) "
+            f"DO UPDATE SET {columns['quantity']} = "
+            f"{table}.{columns['quantity']} + EXCLUDED.{columns['quantity']} "
+            f"RETURNING {columns['product']}, {columns['quantity']}"
+        )
+        created_at = opts.get_field('created_at').get_db_prep_value(
+            timezone.now(), connection)
+        params = []
+        for product_id, quantity in quantities.items():
+            params += [
+                cart.pk,
+                product_field.get_db_prep_value(product_id, connection),
+                quantity,
+                created_at,
+            ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return {
+                product_field.to_python(product_id): new_quantity
+                for product_id, new_quantity in cursor.fetchall()
+            }
+
+    def update(self, cart, product_id, quantity=None, new_product_id=None):
+        """Change a line's quantity or product; a quantity of 0 removes it"""
+        cart_item = CartItem.objects.get(cart=cart, product_id=product_id)
+
+        if quantity is not None and quantity <= 0:
+            cart_item.delete()
+            return
+
+        if new_product_id is not None:
+            cart_item.product_id = new_product_id
+        if quantity is not None:
+            cart_item.quantity = quantity
+        cart_item.save()
+
+    def remove(self, cart, product_id):
+        """Remove a line, returning False if it was not in the cart"""
+        deleted, _ = CartItem.objects.filter(
+            cart=cart, product_id=product_id).delete()
+        return deleted > 0
+
+    def apply(self, cart, operations):
+        """
+        Apply a batch of operations in one transaction.
+
+        The touched lines are locked and read once, the operations are folded
+        into final quantities, and the result is written with one upsert and
+        one delete however many operations there are. Lines not yet in the
+        cart have no row to lock, so when only adds touch them they go
+        through the additive upsert, like single adds, and a concurrent add
+        of the same product is summed rather than overwritten.
+        """
+        product_ids = {operation['product_id'] for operation in operations}
+        with transaction.atomic():
+            current = {
+                str(product_id): quantity
+                for product_id, quantity in CartItem.objects.select_for_update()
+                .filter(cart=cart, product_id__in=product_ids)
+                .values_list('product_id', 'quantity')
+            }
+            resolved = resolve_operations(current, operations)
+
+            overwritten = {str(operation['product_id'])
+                           for operation in operations
+                           if operation['op'] != 'add'}
+            added = {
+                pid: quantity for pid, quantity in resolved.items()
+                if pid not in current and pid not in overwritten
+            }
+            removed = [pid for pid, quantity in resolved.items() if not quantity]
+            kept = [
+                CartItem(cart=cart, product_id=pid, quantity=quantity)
+                for pid, quantity in resolved.items()
+                if quantity and quantity != current.get(pid)
+                and pid not in added
+            ]
+            if removed:
+                CartItem.objects.filter(
+                    cart=cart, product_id__in=removed).delete()
+            if kept:
+                CartItem.objects.bulk_create(
+                    kept, update_conflicts=True,
+                    unique_fields=['cart', 'product'],
+                    update_fields=['quantity'])
+            if added:
+                if connection.vendor in UPSERT_VENDORS:
+                    self._upsert(cart, added)
+                else:
+                    for pid, quantity in added.items():
+                        self._update_or_create(cart, pid, quantity)
+            if kept or added:
+                bump_cart_version(cart.pk)
+
+    def clear(self, cart):
+        delete_cart_rows(cart)
+
+    def flush(self, cart):
+        """Rows are already authoritative; nothing to write through"""
+
+
+class RedisCartStore:
+    """
+    Carts kept in a Redis hash per cart mapping product id to quantity.
+
+    Mutations are single HINCRBY/HSET/HDEL commands, so concurrent adds never
+    lose updates and never touch the database. Carts are seeded from their
+    CartItem rows on first access and written back to CartItem by `flush`,
+    which checkout calls and the `flush_carts` command runs for every cart
+    changed since its last flush.
+    """
+    key_prefix = 'cart_items'
+    dirty_key = 'cart_items:dirty'
+    # Marks a hash as seeded so an emptied cart is not reloaded from rows
+    seeded_field = '_seeded'
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from django_redis import get_redis_connection
+            self._client = get_redis_connection('default')
+        return self._client
+
+    def _key(self, cart):
+        return f"{self.key_prefix}:{cart.pk}"
+
+    def _ensure_seeded(self, cart):
+        key = self._key(cart)
+        if self.client.exists(key):
+            return key
+
+        # HSETNX leaves alone any line a concurrent request already wrote
+        rows = CartItem.objects.filter(cart=cart).values_list(
+            'product_id', 'quantity')
+        for product_id, quantity in rows:
+            self.client.hsetnx(key, str(product_id), quantity)
+        self.client.hsetnx(key, self.seeded_field, 1)
+        return key
+
+    def _mark_dirty(self, cart):
+        self.client.sadd(self.dirty_key, cart.pk)
+        bump_cart_version(cart.pk)
+
+    def quantities(self, cart):
+        """Return {product_id: quantity} for every line in the cart"""
+        key = self._ensure_seeded(cart)
+        lines = {}
+        for field, value in self.client.hgetall(key).items():
+            field = field.decode() if isinstance(field, bytes) else field
+            if field != self.seeded_field:
+                lines[field] = int(value)
+        return lines
+
+    def get_items(self, cart):
+        """Build unsaved CartItems from the hash with products loaded"""
+        lines = self.quantities(cart)
+        products = Product.objects.filter(pk__in=lines.keys()).prefetch_related(
+            main_images_prefetch())
+        return [
+            CartItem(cart=cart, product=product,
+                     quantity=lines[str(product.pk)])
+            for product in products
+        ]
+
+    def totals(self, cart):
+        """Total the hash in SQL, passing its quantities in as a CASE"""
+        lines = self.quantities(cart)
+        quantity = Case(
+            *[When(pk=product_id, then=Value(line_quantity))
+              for product_id, line_quantity in lines.items()],
+            default=Value(0), output_field=IntegerField())
+        return aggregate_cart_lines(
+            Product.objects.filter(pk__in=lines.keys()), quantity)
+
+    def contains(self, cart, product_id):
+        key = self._ensure_seeded(cart)
+        return bool(self.client.hexists(key, str(product_id)))
+
+    def add(self, cart, product_id, quantity):
+        key = self._ensure_seeded(cart)
+        new_quantity = self.client.hincrby(key, str(product_id), quantity)
+        self._mark_dirty(cart)
+        return new_quantity == quantity
+
+    def update(self, cart, product_id, quantity=None, new_product_id=None):
+        key = self._ensure_seeded(cart)
+
+        if quantity is not None and quantity <= 0:
+            self.client.hdel(key, str(product_id))
+        elif new_product_id is not None:
+            if quantity is None:
+                quantity = int(self.client.hget(key, str(product_id)))
+            self.client.hdel(key, str(product_id))
+            self.client.hset(key, str(new_product_id), quantity)
+        elif quantity is not None:
+            self.client.hset(key, str(product_id), quantity)
+        self._mark_dirty(cart)
+
+    def remove(self, cart, product_id):
+        key = self._ensure_seeded(cart)
+        removed = self.client.hdel(key, str(product_id))
+        self._mark_dirty(cart)
+        return removed > 0
+
+    def apply(self, cart, operations):
+        """Apply a batch of operations as one MULTI/EXEC transaction"""
+        key = self._ensure_seeded(cart)
+        pipe = self.client.pipeline()
+        for operation in operations:
+            field = str(operation['product_id'])
+            if operation['op'] == 'add':
+                pipe.hincrby(key, field, operation['quantity'])
+            elif operation['op'] == 'set' and operation['quantity']:
+                pipe.hset(key, field, operation['quantity'])
+            else:
+                pipe.hdel(key, field)
+        pipe.sadd(self.dirty_key, cart.pk)
+        pipe.execute()
+        bump_cart_version(cart.pk)
+
+    def clear(self, cart):
+        """
+        Delete the cart's rows and, once that commits, the same lines from
+        the hash. Checkout clears the lines it flushed and read, so lines
+        added to the hash since then stay in the cart.
+        """
+        product_ids = delete_cart_rows(cart)
+        if product_ids:
+            fields = [str(product_id) for product_id in product_ids]
+            transaction.on_commit(
+                lambda: self.client.hdel(self._key(cart), *fields))
+
+    def flush(self, cart):
+        """Write the hash through to the cart's CartItem rows"""
+        # Leave the dirty set before reading, so a write that lands after
+        # the read marks the cart dirty again instead of being skipped
+        self.client.srem(self.dirty_key, cart.pk)
+        try:
+            lines = self.quantities(cart)
+            with transaction.atomic():
+                CartItem.objects.filter(cart=cart).delete()
+                CartItem.objects.bulk_create([
+                    CartItem(cart=cart, product_id=product_id,
+                             quantity=quantity)
+                    for product_id, quantity in lines.items()
+                ])
+        except Exception:
+            self.client.sadd(self.dirty_key, cart.pk)
+            raise
+
+    def dirty_cart_ids(self):
+        return [
+            int(cart_id) for cart_id in self.client.smembers(self.dirty_key)
+        ]
+
+
+CART_STORES = {
+    'database': DatabaseCartStore,
+    'redis': RedisCartStore,
+}
+
+_store = None
+
+
+def get_cart_store():
+    """Return the cart store selected by the CART_STORE setting"""
+    global _store
+    if _store is None:
+        _store = CART_STORES[getattr(settings, 'CART_STORE', 'database')]()
+    return _store
+
+
+def get_cart_totals(cart, timeout=300):
+    """Return the cart's item count, subtotal, discount and total.
+
+    Totals are computed once per cart version and catalog generation, so the
+    cart payload and checkout share one computation.
+    """
+    key = get_cart_totals_cache_key(cart.pk)
+    totals = cache.get(key)
+    if totals is None:
+        totals = get_cart_store().totals(cart)
+        cache.set(key, totals, timeout=timeout)
+    return totals
+
@@ -1,3 +1,417 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from categories.models import Category
+from products.models import Product, ProductImage
+from users.models import User
+from .models import Cart, CartItem
+from .stores import DatabaseCartStore, RedisCartStore, resolve_operations
 
-# Create your tests here.
+
+class FakeRedis:
+    """The subset of redis-py's hash and set commands the cart store uses"""
+
+    def __init__(self):
+        self.data = {}
+
+    @staticmethod
+    def _bytes(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def delete(self, key):
+        return int(self.data.pop(key, None) is not None)
+
+    def hget(self, key, field):
+        return self.data.get(key, {}).get(self._bytes(field))
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def hexists(self, key, field):
+        return self._bytes(field) in self.data.get(key, {})
+
+    def hset(self, key, field, value):
+        fields = self.data.setdefault(key, {})
+        added = self._bytes(field) not in fields
+        fields[self._bytes(field)] = self._bytes(value)
+        return int(added)
+
+    def hsetnx(self, key, field, value):
+        if self.hexists(key, field):
+            return 0
+        return self.hset(key, field, value)
+
+    def hincrby(self, key, field, amount):
+        value = int(self.hget(key, field) or 0) + amount
+        self.hset(key, field, value)
+        return value
+
+    def hdel(self, key, *fields):
+        values = self.data.get(key, {})
+        return sum(values.pop(self._bytes(field), None) is not None
+                   for field in fields)
+
+    def sadd(self, key, member):
+        members = self.data.setdefault(key, set())
+        added = self._bytes(member) not in members
+        members.add(self._bytes(member))
+        return int(added)
+
+    def srem(self, key, member):
+        members = self.data.get(key, set())
+        removed = self._bytes(member) in members
+        members.discard(self._bytes(member))
+        return int(removed)
+
+    def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Queue commands and run them back to back on execute()"""
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args):
+            self.commands.append((getattr(self.client, name), args))
+            return self
+        return queue
+
+    def execute(self):
+        return [command(*args) for command, args in self.commands]
+
+
+class CartQueryCountTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='shopper', email='shopper@example.com', password='test123!')
+        category = Category.objects.create(name='Electronics')
+        cls.products = []
+        for i in range(31):
+            product = Product.objects.create(
+                name=f'Product {i}',
+                description='Test product',
+                price='10.00',
+                category=category,
+                brand='Acme'
+            )
+            ProductImage.objects.create(
+                product=product, image=f'products/{i}-main', is_main=True)
+            ProductImage.objects.create(
+                product=product, image=f'products/{i}-alt')
+            cls.products.append(product)
+
+        cart = Cart.objects.create(user=cls.user)
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product, quantity=1)
+            for product in cls.products[:30]
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_cart_detail_queries(self):
+        # Cart with user, items with products, main images, and totals
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('cart:cart-detail'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        products = response.data['cart']['products']
+        self.assertEqual(len(products), 30)
+        for product in products:
+            self.assertIn('-main', product['image'])
+
+    def test_cached_cart_has_the_same_shape(self):
+        first = self.client.get(reverse('cart:cart-detail'))
+
+        # Only the cart lookup; the payload comes from the cache
+        with self.assertNumQueries(1):
+            second = self.client.get(reverse('cart:cart-detail'))
+
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(len(second.data['cart']['products']), 30)
+
+    def test_add_to_cart_queries_do_not_grow_with_cart(self):
+        url = reverse('cart:add-to-cart')
+        data = {'product_id': str(self.products[30].id), 'quantity': 1}
+
+        # Four for validation and the upsert, two to load the items, and one
+        # for the totals
+        with self.assertNumQueries(7):
+            response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['cart']['products']), 31)
+
+    def test_batch_queries_do_not_grow_with_operations(self):
+        operations = [
+            {'op': 'add', 'product_id': str(product.id), 'quantity': 2}
+            for product in self.products[:10]
+        ] + [
+            {'op': 'set', 'product_id': str(product.id), 'quantity': 5}
+            for product in self.products[10:20]
+        ] + [
+            {'op': 'remove', 'product_id': str(product.id)}
+            for product in self.products[20:30]
+        ] + [{'op': 'set', 'product_id': str(self.products[30].id), 'quantity': 1}]
+
+        # Product check, cart, locked read, delete (rows are selected first
+        # for their signals) and upsert inside a savepoint, then two to load
+        # the items and one for the totals
+        with self.assertNumQueries(11):
+            response = self.client.post(reverse('cart:cart-batch'),
+                                        {'operations': operations}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        quantities = {product['id']: product['quantity']
+                      for product in response.data['cart']['products']}
+        expected = {str(product.id): 3 for product in self.products[:10]}
+        expected.update({str(product.id): 5 for product in self.products[10:20]})
+        expected[str(self.products[30].id)] = 1
+        self.assertEqual(quantities, expected)
+
+    def test_totals_honor_discounted_prices(self):
+        Product.objects.filter(pk__in=[p.pk for p in self.products[:10]]).update(
+            discounted_price='7.50')
+        CartItem.objects.filter(product=self.products[0]).update(quantity=3)
+
+        response = self.client.get(reverse('cart:cart-detail'))
+
+        self.assertEqual(response.data['cart']['totals'], {
+            'itemCount': 32,
+            'subtotal': '320.00',
+            'discount': '30.00',
+            'total': '290.00',
+        })
+
+    def test_batch_add_of_a_new_line_keeps_a_concurrent_add(self):
+        cart = Cart.objects.get(user=self.user)
+        product = self.products[30]
+        store = DatabaseCartStore()
+
+        # Another request adds the product after the batch read the cart
+        def add_concurrently(quantities, operations):
+            store.add(cart, product.pk, 2)
+            return resolve_operations(quantities, operations)
+
+        with mock.patch('cart.stores.resolve_operations', add_concurrently):
+            store.apply(cart, [
+                {'op': 'add', 'product_id': product.pk, 'quantity': 3}])
+
+        self.assertEqual(CartItem.objects.get(product=product).quantity, 5)
+
+    def test_batch_rejects_unknown_products(self):
+        response = self.client.post(reverse('cart:cart-batch'), {'operations': [
+            {'op': 'add', 'product_id': str(self.products[0].id), 'quantity': 1},
+            {'op': 'add', 'product_id': '00000000-0000-0000-0000-000000000000',
+             'quantity': 1},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(CartItem.objects.get(product=self.products[0]).quantity, 1)
+
+
+class RedisCartStoreTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='shopper', email='shopper@example.com', password='test123!')
+        category = Category.objects.create(name='Electronics')
+        cls.first, cls.second = [
+            Product.objects.create(
+                name=f'Product {i}', description='Test product',
+                price='10.00', category=category, brand='Acme')
+            for i in range(2)
+        ]
+        cls.cart = Cart.objects.create(user=cls.user)
+        CartItem.objects.create(cart=cls.cart, product=cls.first, quantity=2)
+
+    def setUp(self):
+        self.store = RedisCartStore(client=FakeRedis())
+
+    def test_seeds_from_rows_and_increments_in_redis(self):
+        self.assertFalse(self.store.add(self.cart, self.first.pk, 3))
+        self.assertTrue(self.store.add(self.cart, self.second.pk, 1))
+
+        self.assertEqual(self.store.quantities(self.cart), {
+            str(self.first.pk): 5, str(self.second.pk): 1})
+        # Rows are untouched until the cart is flushed
+        self.assertEqual(CartItem.objects.get(product=self.first).quantity, 2)
+        self.assertEqual(self.store.dirty_cart_ids(), [self.cart.pk])
+
+    def test_get_items_loads_products(self):
+        self.store.add(self.cart, self.second.pk, 4)
+
+        items = {item.product: item.quantity
+                 for item in self.store.get_items(self.cart)}
+        self.assertEqual(items, {self.first: 2, self.second: 4})
+
+    def test_update_and_remove(self):
+        self.store.update(self.cart, self.first.pk, new_product_id=self.second.pk)
+        self.assertEqual(self.store.quantities(self.cart),
+                         {str(self.second.pk): 2})
+
+        self.assertTrue(self.store.remove(self.cart, self.second.pk))
+        self.assertFalse(self.store.remove(self.cart, self.second.pk))
+        # An emptied cart is not reseeded from its rows
+        self.assertEqual(self.store.quantities(self.cart), {})
+
+    def test_totals_are_computed_from_the_hash(self):
+        Product.objects.filter(pk=self.second.pk).update(discounted_price='8.00')
+        self.store.add(self.cart, self.second.pk, 2)
+
+        totals = self.store.totals(self.cart)
+
+        self.assertEqual(totals['item_count'], 4)
+        self.assertEqual(totals['subtotal'], Decimal('40.00'))
+        self.assertEqual(totals['discount'], Decimal('4.00'))
+        self.assertEqual(totals['total'], Decimal('36.00'))
+
+    def test_apply_runs_operations_in_order(self):
+        self.store.apply(self.cart, [
+            {'op': 'add', 'product_id': self.first.pk, 'quantity': 1},
+            {'op': 'set', 'product_id': self.second.pk, 'quantity': 4},
+            {'op': 'add', 'product_id': self.second.pk, 'quantity': 1},
+            {'op': 'set', 'product_id': self.first.pk, 'quantity': 0},
+        ])
+
+        self.assertEqual(self.store.quantities(self.cart),
+                         {str(self.second.pk): 5})
+
+    def test_flush_writes_through_to_rows(self):
+        self.store.add(self.cart, self.first.pk, 1)
+        self.store.add(self.cart, self.second.pk, 6)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.store.flush(self.cart)
+
+        rows = dict(CartItem.objects.filter(cart=self.cart).values_list(
+            'product_id', 'quantity'))
+        self.assertEqual(rows, {self.first.pk: 3, self.second.pk: 6})
+        self.assertEqual(self.store.dirty_cart_ids(), [])
+
+    def test_write_during_flush_keeps_the_cart_dirty(self):
+        self.store.add(self.cart, self.first.pk, 1)
+        quantities = self.store.quantities
+
+        def add_after_read(cart):
+            lines = quantities(cart)
+            self.store.add(self.cart, self.second.pk, 2)
+            return lines
+
+        with mock.patch.object(self.store, 'quantities', add_after_read):
+            self.store.flush(self.cart)
+
+        self.assertEqual(self.store.dirty_cart_ids(), [self.cart.pk])
+
+    def test_failed_flush_keeps_the_cart_dirty(self):
+        self.store.add(self.cart, self.first.pk, 1)
+
+        with mock.patch.object(CartItem.objects, 'bulk_create',
+                               side_effect=DatabaseError), \
+                self.assertRaises(DatabaseError):
+            self.store.flush(self.cart)
+
+        self.assertEqual(self.store.dirty_cart_ids(), [self.cart.pk])
+
+    def test_clear_keeps_lines_added_after_the_flush(self):
+        self.store.flush(self.cart)
+        self.store.add(self.cart, self.second.pk, 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.store.clear(self.cart)
+
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+        self.assertEqual(self.store.quantities(self.cart),
+                         {str(self.second.pk): 3})
+
+
+class CartCacheTestCase(TransactionTestCase):
+    """Runs in autocommit, as requests do, so cart versions bump on write"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='shopper', email='shopper@example.com', password='test123!')
+        category = Category.objects.create(name='Electronics')
+        self.first, self.second = [
+            Product.objects.create(
+                name=f'Product {i}', description='Test product',
+                price='10.00', category=category, brand='Acme')
+            for i in range(2)
+        ]
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.first, quantity=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_mutations_write_the_cart_through(self):
+        self.client.get(reverse('cart:cart-detail'))
+        self.client.post(reverse('cart:add-to-cart'), {
+            'product_id': str(self.second.id), 'quantity': 2
+        }, format='json')
+
+        # Only the cart lookup; the add cached the fresh payload
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('cart:cart-detail'))
+
+        self.assertEqual(len(response.data['cart']['products']), 2)
+        self.assertEqual(response.data['cart']['totals']['itemCount'], 3)
+
+    def test_item_writes_outside_the_api_retire_the_cache(self):
+        self.client.get(reverse('cart:cart-detail'))
+        CartItem.objects.create(
+            cart=self.user.cart, product=self.second, quantity=4)
+
+        response = self.client.get(reverse('cart:cart-detail'))
+
+        self.assertEqual(response.data['cart']['totals']['itemCount'], 5)
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class ConcurrentAddToCartTestCase(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='shopper', email='shopper@example.com', password='test123!')
+        category = Category.objects.create(name='Electronics')
+        self.product = Product.objects.create(
+            name='Product', description='Test product', price='10.00',
+            category=category, brand='Acme')
+        Cart.objects.create(user=self.user)
+
+    def add_to_cart(self, quantity):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        try:
+            return client.post(reverse('cart:add-to-cart'), {
+                'product_id': str(self.product.id), 'quantity': quantity
+            }, format='json').status_code
+        finally:
+            connection.close()
+
+    def test_parallel_adds_are_not_lost(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            statuses = list(pool.map(self.add_to_cart, [1] * 20))
+
+        self.assertEqual(statuses, [status.HTTP_201_CREATED] * 20)
+        item = CartItem.objects.get(cart__user=self.user, product=self.product)
+        self.assertEqual(item.quantity, 20)
@@ -0,0 +1,35 @@
+from decimal import Decimal
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def unit_price(product):
+    """The price a cart line is charged per unit"""
+    if product.discounted_price is not None:
+        return product.discounted_price
+    return product.price
+
+
+def aggregate_cart_lines(queryset, quantity, product_prefix=''):
+    """
+    Total a queryset of cart lines in a single aggregate query.
+
+    `quantity` is an expression for each row's quantity and `product_prefix`
+    the lookup path from the queryset's model to Product. Lines are charged
+    at their discounted price when one is set; `discount` is what that saves
+    against the list price.
+    """
+    money = DecimalField(max_digits=12, decimal_places=2)
+    price = F(f'{product_prefix}price')
+    unit_price = Coalesce(F(f'{product_prefix}discounted_price'), price)
+    zero = Value(Decimal('0.00'), output_field=money)
+
+    totals = queryset.order_by().aggregate(
+        item_count=Coalesce(Sum(quantity), 0),
+        subtotal=Coalesce(Sum(ExpressionWrapper(
+            price * quantity, output_field=money)), zero),
+        total=Coalesce(Sum(ExpressionWrapper(
+            unit_price * quantity, output_field=money)), zero),
+    )
+    totals['discount'] = totals['subtotal'] - totals['total']
+    return totals
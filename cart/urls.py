@@ -1,10 +1,11 @@
 from django.urls import path
-from cart.views import AddToCartView, CartDetailView, RemoveFromCartView, UpdateCartItemView
+from cart.views import AddToCartView, CartBatchView, CartDetailView, RemoveFromCartView, UpdateCartItemView
 
 app_name = 'cart'
 urlpatterns = [
     path('cart/', CartDetailView.as_view(), name='cart-detail'),
     path('cart/add/', AddToCartView.as_view(), name='add-to-cart'),
+    path('cart/batch/', CartBatchView.as_view(), name='cart-batch'),
     path('cart/update/<uuid:product_id>/',
          UpdateCartItemView.as_view(), name='update-cart-item'),
     path('cart/remove/<uuid:product_id>/',
@@ -5,31 +5,46 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from django.core.cache import cache
 from products.models import Product
-from .models import Cart, CartItem
-from .serializers import AddToCartSerializer, CartItemUpdateSerializer, CartSerializer
+from .models import Cart
+from .serializers import AddToCartSerializer, CartBatchSerializer, CartItemUpdateSerializer, CartSerializer
+from .cache import get_cart_cache_key
+from .stores import get_cart_store, get_cart_totals
 
 
-def get_cart_cache_key(user_id):
-    return f"cart:{user_id}"
+def get_user_cart(user):
+    cart, _ = Cart.objects.select_related('user').get_or_create(user=user)
+    return cart
 
 
-class CartDetailView(APIView):
-    permission_classes = [IsAuthenticated]
+def get_cart_data(cart, request):
+    """Serialize a cart and write it to the cache under its current version.
 
-    def get(self, request, *args, **kwargs):
-        cache_key = get_cart_cache_key(request.user.id)
-        cached_cart = cache.get(cache_key)
+    The key is taken before the items are read, so a write that races with
+    the read leaves this payload under a version that is already retired.
+    """
+    cache_key = get_cart_cache_key(cart.pk)
+    items = get_cart_store().get_items(cart)
+    cart_data = CartSerializer(cart, context={
+        'request': request,
+        'items': items,
+        'totals': get_cart_totals(cart)
+    }).data
 
-        if cached_cart:
-            return Response({"success": True, "data": cached_cart}, status=status.HTTP_200_OK)
+    # Cache the cart data for 5 minutes
+    cache.set(cache_key, cart_data, timeout=300)
+    return cart_data
 
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-        serializer = CartSerializer(cart, context={'request': request})
 
-        # Cache the cart data for 5 minutes
-        cache.set(cache_key, serializer.data, timeout=300)
+class CartDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        cart = get_user_cart(request.user)
+        cart_data = cache.get(get_cart_cache_key(cart.pk))
+        if cart_data is None:
+            cart_data = get_cart_data(cart, request)
 
-        return Response({"success": True, "cart": serializer.data}, status=status.HTTP_200_OK)
+        return Response({"success": True, "cart": cart_data}, status=status.HTTP_200_OK)
 
 
 class AddToCartView(APIView):
@@ -44,28 +59,18 @@ class AddToCartView(APIView):
         quantity = serializer.validated_data['quantity']
 
         product = get_object_or_404(Product, id=product_id)
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-        existing_cart_item = CartItem.objects.filter(
-            cart=cart, product=product).first()
+        cart = get_user_cart(request.user)
 
-        if existing_cart_item:
-            existing_cart_item.quantity += quantity
-            existing_cart_item.save()
-            message = "Item quantity updated in cart."
-        else:
-            CartItem.objects.create(
-                cart=cart, product=product, quantity=quantity)
+        if get_cart_store().add(cart, product.pk, quantity):
             message = "Item added to cart."
+        else:
+            message = "Item quantity updated in cart."
 
-        # Invalidate the cart cache
-        cache_key = get_cart_cache_key(request.user.id)
-        cache.delete(cache_key)
-
-        cart_serializer = CartSerializer(cart, context={'request': request})
+        cart_data = get_cart_data(cart, request)
         return Response({
             "success": True,
             "message": message,
-            "cart": cart_serializer.data
+            "cart": cart_data
         }, status=status.HTTP_201_CREATED)
 
 
@@ -73,27 +78,24 @@ class UpdateCartItemView(APIView):
     permission_classes = [IsAuthenticated]
 
     def patch(self, request, product_id, *args, **kwargs):
-        cart = Cart.objects.get(user=request.user)
-        try:
-            cart_item = CartItem.objects.get(cart=cart, product_id=product_id)
-        except CartItem.DoesNotExist:
+        cart = Cart.objects.select_related('user').get(user=request.user)
+        store = get_cart_store()
+        if not store.contains(cart, product_id):
             return Response({"success": False, "message": "Cart item not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = CartItemUpdateSerializer(
-            cart_item, data=request.data, partial=True)
+        serializer = CartItemUpdateSerializer(data=request.data, context={
+            'cart': cart, 'product_id': product_id, 'store': store})
         if serializer.is_valid():
-            serializer.save()
-
-            # Invalidate the cart cache
-            cache_key = get_cart_cache_key(request.user.id)
-            cache.delete(cache_key)
+            store.update(
+                cart, product_id,
+                quantity=serializer.validated_data.get('quantity'),
+                new_product_id=serializer.validated_data.get('product_id'))
 
-            cart_serializer = CartSerializer(
-                cart, context={'request': request})
+            cart_data = get_cart_data(cart, request)
             return Response({
                 "success": True,
                 "message": "Cart item updated successfully.",
-                "cart": cart_serializer.data
+                "cart": cart_data
             }, status=status.HTTP_200_OK)
 
         return Response({"success": False, "errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
@@ -103,21 +105,33 @@ class RemoveFromCartView(APIView):
     permission_classes = [IsAuthenticated]
 
     def delete(self, request, product_id, *args, **kwargs):
-        cart = Cart.objects.get(user=request.user)
-        try:
-            cart_item = CartItem.objects.get(cart=cart, product_id=product_id)
-        except CartItem.DoesNotExist:
+        cart = Cart.objects.select_related('user').get(user=request.user)
+        if not get_cart_store().remove(cart, product_id):
             return Response({"success": False, "message": "Cart item not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        cart_item.delete()
+        cart_data = get_cart_data(cart, request)
+        return Response({
+            "success": True,
+            "message": "Item removed from cart.",
+            "cart": cart_data
+        }, status=status.HTTP_200_OK)
+
+
+class CartBatchView(APIView):
+    """Apply a list of add/set/remove operations and return the cart once"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = CartBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"success": False, "errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Invalidate the cart cache
-        cache_key = get_cart_cache_key(request.user.id)
-        cache.delete(cache_key)
+        cart = get_user_cart(request.user)
+        get_cart_store().apply(cart, serializer.validated_data['operations'])
 
-        cart_serializer = CartSerializer(cart, context={'request': request})
+        cart_data = get_cart_data(cart, request)
         return Response({
             "success": True,
-            "message": "Item removed from cart.",
-            "cart": cart_serializer.data
+            "message": "Cart updated.",
+            "cart": cart_data
         }, status=status.HTTP_200_OK)
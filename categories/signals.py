@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from core.cache import CATALOG, invalidate_cache_tags
+from .models import Category
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_caches(sender, **kwargs):
+    invalidate_cache_tags(CATALOG)
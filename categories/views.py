@@ -4,12 +4,15 @@ from rest_framework import status
 from .models import Category
 from .serializers import CategorySerializer
 from core.utils import IsAdminOrReadOnly
+from core.cache import cache_response, conditional_catalog_get
 from rest_framework.pagination import PageNumberPagination
 
 
 class CategoryListView(APIView):
     permission_classes = [IsAdminOrReadOnly]
 
+    @conditional_catalog_get
+    @cache_response()
     def get(self, request):
         categories = Category.objects.all()
 
@@ -51,6 +54,8 @@ class CategoryDetailView(APIView):
         except Category.DoesNotExist:
             return None
 
+    @conditional_catalog_get
+    @cache_response()
     def get(self, request, pk):
         category = self.get_object(pk)
         if category is None:
@@ -1,3 +1,9 @@
 from django.contrib import admin
+from .models import IdempotencyKey
 
-# Register your models here.
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('key', 'status_code', 'created_at')
+    readonly_fields = ('key', 'request_hash', 'status_code',
+                       'response_data', 'created_at')
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import time
+from functools import wraps
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+
+CATALOG = 'catalog'
+
+
+def _generation_key(namespace):
+    return f"cache_generation:{namespace}"
+
+
+def _initial_generation():
+    # Seed from the clock so a counter lost to eviction never restarts at a
+    # number that still has entries cached under it.
+    return int(time.time() * 1000)
+
+
+def get_cache_generation(namespace=CATALOG):
+    """Return the current generation number of a cache namespace"""
+    key = _generation_key(namespace)
+    generation = cache.get(key)
+    if generation is None:
+        generation = _initial_generation()
+        if not cache.add(key, generation, timeout=None):
+            generation = cache.get(key, generation)
+    return generation
+
+
+def bump_cache_generation(namespace=CATALOG):
+    """Atomically move a namespace to a new generation.
+
+    Keys built from the previous generation are never read again and simply
+    expire on their own timeout, so invalidation costs a single INCR.
+    """
+    key = _generation_key(namespace)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        generation = _initial_generation()
+        cache.set(key, generation, timeout=None)
+        return generation
+
+
+def invalidate_cache_tags(*tags):
+    """Retire every cached entry built under any of `tags`"""
+    for tag in tags:
+        bump_cache_generation(tag)
+
+
+def _entry(value, previous=None):
+    """Wrap a value with its ETag and Last-Modified validators.
+
+    The ETag is a hash of the value's JSON, computed once when an entry is
+    filled rather than on every response. Last-Modified is when the value
+    first looked this way: a refresh that yields the same ETag keeps the
+    previous entry's time.
+    """
+    etag = hashlib.md5(
+        json.dumps(value, cls=JSONEncoder).encode()).hexdigest()
+    if previous is not None and previous.get('etag') == etag:
+        last_modified = previous['last_modified']
+    else:
+        last_modified = time.time()
+    return {'value': value, 'etag': etag, 'last_modified': last_modified}
+
+
+def get_or_compute_entry(key, compute, timeout, stale_timeout=60,
+                         lock_timeout=10, wait=2.0, poll_interval=0.05):
+    """Read a cached entry, letting only one worker recompute it on a miss.
+
+    Entries are stored with a refresh deadline `timeout` seconds out but are
+    kept for another `stale_timeout` seconds. The first worker past the
+    deadline takes a short lock and recomputes; concurrent workers keep
+    serving the stale entry meanwhile. On a cold miss the other workers poll
+    for up to `wait` seconds for the leader's result before computing it
+    themselves. The entry holds the `value` and, for `attach_validators`,
+    its `etag` and `last_modified`.
+    """
+    entry = cache.get(key)
+    if entry is not None and entry['refresh_at'] > time.time():
+        return entry
+
+    lock_key = f"{key}:lock"
+    if not cache.add(lock_key, 1, timeout=lock_timeout):
+        if entry is not None:
+            return entry
+
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            time.sleep(poll_interval)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry
+        return _entry(compute())
+
+    try:
+        fresh = _entry(compute(), previous=entry)
+        fresh['refresh_at'] = time.time() + timeout
+        cache.set(key, fresh, timeout=timeout + stale_timeout)
+        return fresh
+    finally:
+        cache.delete(lock_key)
+
+
+def get_or_compute(key, compute, timeout, **kwargs):
+    """Return the value of `get_or_compute_entry`"""
+    return get_or_compute_entry(key, compute, timeout, **kwargs)['value']
+
+
+def attach_validators(response, *entries):
+    """Give `response` the validators of the cache entries it was built from.
+
+    `conditional_catalog_get` answers from these; several entries, such as
+    a page and its facets, combine into one ETag and their latest
+    Last-Modified. Entries cached before they carried validators leave the
+    response without any.
+    """
+    etags = [entry.get('etag') for entry in entries]
+    if entries and None not in etags:
+        response.cache_validators = {
+            'etag': hashlib.md5(':'.join(etags).encode()).hexdigest(),
+            'last_modified': max(
+                entry['last_modified'] for entry in entries),
+        }
+    return response
+
+
+def conditional_catalog_get(view_method):
+    """Answer catalog GETs with 304 Not Modified while the client is current.
+
+    The view still runs, but the handlers it wraps serve from the cache and
+    attach the validators stored with their entries, so checking
+    If-None-Match and If-Modified-Since costs no serialization and a match
+    skips rendering the body. The strong ETag also covers the Accept header,
+    since each media type is its own representation. Responses without
+    validators pass through unchanged.
+    """
+    @wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        response = view_method(view, request, *args, **kwargs)
+        validators = getattr(response, 'cache_validators', None)
+        if response.status_code != 200 or validators is None:
+            return response
+
+        accept = request.META.get('HTTP_ACCEPT', '')
+        etag = quote_etag(hashlib.md5(
+            f"{accept}:{validators['etag']}".encode()).hexdigest())
+        last_modified = int(validators['last_modified'])
+
+        patch_vary_headers(response, ['Accept'])
+        response.headers['ETag'] = etag
+        response.headers['Last-Modified'] = http_date(last_modified)
+        return get_conditional_response(
+            request, etag=etag, last_modified=last_modified,
+            response=response)
+
+    return wrapper
+
+
+def _response_vary_key(request, vary_on):
+    user = request.user
+    if vary_on is None:
+        return 'all'
+    if not user.is_authenticated:
+        return 'anonymous'
+    if vary_on == 'user':
+        return f"user-{user.pk}"
+    if vary_on == 'role':
+        return f"role-{getattr(user, 'role', None)}-{int(user.is_staff)}"
+    raise ValueError(f"Unknown vary_on value: {vary_on!r}")
+
+
+def cache_response(timeout=900, tags=(CATALOG,), vary_on=None):
+    """Cache the data of successful responses from an APIView GET handler.
+
+    Entries are keyed on the request path, the current generation of every
+    tag and, with `vary_on='user'` or `vary_on='role'`, the requesting user
+    or their role; by default one entry is shared by every caller. Calling
+    `invalidate_cache_tags` with any of the tags retires the entries. Only
+    response data is stored, with its validators for
+    `conditional_catalog_get`, so content negotiation still runs on hits.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(view, request, *args, **kwargs):
+            generations = ':'.join(
+                str(get_cache_generation(tag)) for tag in tags)
+            path_hash = hashlib.md5(
+                request.get_full_path().encode()).hexdigest()
+            vary_key = _response_vary_key(request, vary_on)
+            key = f"response_entry:{path_hash}:{generations}:{vary_key}"
+
+            entry = cache.get(key)
+            if entry is not None:
+                return attach_validators(Response(entry['value']), entry)
+
+            response = view_method(view, request, *args, **kwargs)
+            if response.status_code == 200 and isinstance(response, Response):
+                entry = _entry(response.data)
+                cache.set(key, entry, timeout=timeout)
+                attach_validators(response, entry)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,167 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+# How long a completed response is replayed for
+REPLAY_TIMEOUT = 24 * 60 * 60
+# After this long an unfinished request is taken to have died
+IN_PROGRESS_TIMEOUT = 60
+
+
+def _scoped_key(request, key):
+    user = request.user.pk if request.user.is_authenticated else 'anonymous'
+    return hashlib.sha256(
+        f"{user}:{request.method}:{request.path}:{key}".encode()).hexdigest()
+
+
+def _request_hash(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _cache_key(scoped_key):
+    return f"idempotency:{scoped_key}"
+
+
+def _record(row):
+    return {
+        'request_hash': row.request_hash,
+        'status_code': row.status_code,
+        'response_data': row.response_data,
+    }
+
+
+def _load(scoped_key):
+    """Return a completed record from the cache, else from the database"""
+    try:
+        record = cache.get(_cache_key(scoped_key))
+    except Exception:
+        # The database below is the fallback for an unavailable cache
+        record = None
+    if record is not None:
+        return record
+
+    cutoff = timezone.now() - timedelta(seconds=REPLAY_TIMEOUT)
+    row = IdempotencyKey.objects.filter(
+        key=scoped_key, status_code__isnull=False,
+        created_at__gte=cutoff).first()
+    return _record(row) if row is not None else None
+
+
+def purge_expired_keys():
+    """Delete records past their replay window, returning how many"""
+    cutoff = timezone.now() - timedelta(seconds=REPLAY_TIMEOUT)
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
+
+
+def _claim(scoped_key, request_hash):
+    """Insert the key's row; returns None if won, else the existing record"""
+    now = timezone.now()
+    IdempotencyKey.objects.filter(key=scoped_key).filter(
+        Q(created_at__lt=now - timedelta(seconds=REPLAY_TIMEOUT)) |
+        Q(status_code__isnull=True,
+          created_at__lt=now - timedelta(seconds=IN_PROGRESS_TIMEOUT))
+    ).delete()
+
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(
+                key=scoped_key, request_hash=request_hash)
+        return None
+    except IntegrityError:
+        row = IdempotencyKey.objects.filter(key=scoped_key).first()
+        if row is None:
+            # Released between our insert and this read; let it be retried
+            return {'request_hash': request_hash, 'status_code': None,
+                    'response_data': None}
+        return _record(row)
+
+
+def _store(scoped_key, request_hash, response):
+    # Round trip through JSON so the cache and database hold the same data
+    data = json.loads(json.dumps(response.data, cls=DjangoJSONEncoder))
+    IdempotencyKey.objects.filter(key=scoped_key).update(
+        status_code=response.status_code, response_data=data)
+    try:
+        cache.set(_cache_key(scoped_key), {
+            'request_hash': request_hash,
+            'status_code': response.status_code,
+            'response_data': data,
+        }, timeout=REPLAY_TIMEOUT)
+    except Exception:
+        pass
+
+
+def _release(scoped_key):
+    IdempotencyKey.objects.filter(
+        key=scoped_key, status_code__isnull=True).delete()
+
+
+def idempotent(view_method):
+    """Replay the stored response of APIView handler calls that repeat an
+    Idempotency-Key header instead of running the handler again.
+
+    Keys are scoped to the user, method and path. The first request with a
+    key runs the handler and its response is kept for 24 hours; repeats get
+    that response back with an `Idempotent-Replayed: true` header, a repeat
+    while the first is still running gets 409, and reusing a key with a
+    different body gets 422. Server errors are not kept, so they can be
+    retried with the same key. Requests without the header run as usual.
+    """
+    @wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(view, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({
+                "success": False,
+                "message": "Idempotency-Key must be at most 255 characters."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        scoped_key = _scoped_key(request, key)
+        request_hash = _request_hash(request)
+
+        record = _load(scoped_key)
+        if record is None:
+            record = _claim(scoped_key, request_hash)
+        if record is None:
+            try:
+                response = view_method(view, request, *args, **kwargs)
+            except Exception:
+                _release(scoped_key)
+                raise
+            if (isinstance(response, Response)
+                    and response.status_code < 500):
+                _store(scoped_key, request_hash, response)
+            else:
+                _release(scoped_key)
+            return response
+
+        if record['request_hash'] != request_hash:
+            return Response({
+                "success": False,
+                "message": "Idempotency-Key was already used with a different request."
+            }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if record['status_code'] is None:
+            return Response({
+                "success": False,
+                "message": "A request with this Idempotency-Key is still in progress."
+            }, status=status.HTTP_409_CONFLICT)
+
+        return Response(record['response_data'], status=record['status_code'],
+                        headers={'Idempotent-Replayed': 'true'})
+
+    return wrapper
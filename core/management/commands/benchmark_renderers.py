@@ -0,0 +1,91 @@
+import timeit
+import uuid
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from core.renderers import MessagePackRenderer, ORJSONRenderer
+
+
+def build_product_page(size):
+    """Build a product list page shaped like the ProductListAPIView response"""
+    now = timezone.now()
+    category_id = uuid.uuid4()
+    results = []
+    for i in range(size):
+        results.append({
+            'id': uuid.uuid4(),
+            'name': f'Product {i}',
+            'category': 'Electronics',
+            'description': 'A dependable everyday product. ' * 8,
+            'price': Decimal('199.99') + i,
+            'discounted_price': Decimal('149.99') + i,
+            'brand': 'Acme',
+            'stock_quantity': 25 + i,
+            'is_active': True,
+            'rating': 4.3,
+            'images': [
+                {
+                    'id': uuid.uuid4(),
+                    'image_url': f'https://res.cloudinary.com/demo/image/upload/products/{i}-{n}.jpg',
+                    'is_main': n == 0,
+                }
+                for n in range(3)
+            ],
+            'features': ['Wireless', 'Fast charging', 'Water resistant'],
+            'specifications': {
+                'weight': '250g',
+                'dimensions': {'width': 7.1, 'height': 14.6, 'depth': 0.8},
+                'category_id': category_id,
+                'released': now,
+            },
+            'tags': ['new', 'popular'],
+            'created_at': now,
+            'updated_at': now,
+        })
+    return {
+        'count': size * 10,
+        'next': 'https://shop-ease-3oxf.onrender.com/api/v1/products/?page=2',
+        'previous': None,
+        'results': results,
+    }
+
+
+class Command(BaseCommand):
+    help = "Compare render time and payload size of the API renderers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100,
+                            help="Products per rendered page.")
+        parser.add_argument('--iterations', type=int, default=200,
+                            help="Renders timed per renderer.")
+
+    def handle(self, *args, **options):
+        page = build_product_page(options['products'])
+        iterations = options['iterations']
+        renderers = [
+            ('JSONRenderer', JSONRenderer()),
+            ('ORJSONRenderer', ORJSONRenderer()),
+            ('MessagePackRenderer', MessagePackRenderer()),
+        ]
+
+        outputs = {name: renderer.render(page) for name, renderer in renderers}
+        if outputs['ORJSONRenderer'] != outputs['JSONRenderer']:
+            self.stderr.write(self.style.ERROR("JSON renderer outputs differ."))
+            return
+
+        self.stdout.write(
+            f"{options['products']} products, {iterations} iterations")
+
+        baseline_time = baseline_size = None
+        for name, renderer in renderers:
+            elapsed = timeit.timeit(
+                lambda: renderer.render(page), number=iterations)
+            per_render = elapsed / iterations * 1000
+            size = len(outputs[name])
+            baseline_time = baseline_time or per_render
+            baseline_size = baseline_size or size
+            self.stdout.write(
+                f"{name:<20} {per_render:8.3f} ms/render "
+                f"{baseline_time / per_render:6.1f}x "
+                f"{size:>9} bytes {size / baseline_size:7.1%}")
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from core.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = ("Delete idempotency key records older than their replay window. "
+            "Run periodically; keys are otherwise only purged when reused.")
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys()
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted} expired idempotency keys."))
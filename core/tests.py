@@ -1,3 +1,262 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import time
+import uuid
+from decimal import Decimal
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+from categories.models import Category
+from products.models import Product
+from users.models import User
+from .cache import cache_response, get_or_compute, invalidate_cache_tags
+from .idempotency import REPLAY_TIMEOUT
+from .models import IdempotencyKey
+from .parsers import MessagePackParser
+from .renderers import MessagePackRenderer, ORJSONRenderer
 
-# Create your tests here.
+
+class ORJSONRendererTestCase(SimpleTestCase):
+    def test_output_matches_json_renderer(self):
+        data = {
+            'id': uuid.uuid4(),
+            'price': Decimal('19.99'),
+            'created_at': timezone.now(),
+            'launch_date': datetime.date(2025, 2, 20),
+            'name': 'Caf\u00e9 \u2028 speaker',
+            'message': gettext_lazy('Product retrieved successfully.'),
+            'errors': {'name': [ErrorDetail('This field is required.')]},
+            'specifications': {'weight': 1.25, 'ports': ['usb-c', None]},
+            'features': [True, False, 0, -3],
+        }
+
+        self.assertEqual(
+            ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indented_output_uses_json_renderer(self):
+        data = {'products': [{'price': Decimal('5.00')}]}
+        context = {'indent': 4}
+
+        self.assertEqual(
+            ORJSONRenderer().render(data, renderer_context=context),
+            JSONRenderer().render(data, renderer_context=context)
+        )
+
+    def test_none_renders_empty_body(self):
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+
+class MessagePackRendererTestCase(SimpleTestCase):
+    def test_round_trip_matches_json_values(self):
+        data = {
+            'id': uuid.uuid4(),
+            'price': Decimal('19.99'),
+            'created_at': timezone.now(),
+            'items': [{'quantity': 2, 'name': 'Café'}],
+        }
+
+        rendered = MessagePackRenderer().render(data)
+        parsed = MessagePackParser().parse(io.BytesIO(rendered))
+
+        self.assertEqual(parsed, json.loads(JSONRenderer().render(data)))
+
+
+class MessagePackRequestTestCase(TestCase):
+    def test_staff_can_create_a_product_from_msgpack(self):
+        staff = User.objects.create_user(
+            username='staff', email='staff@example.com', password='test123!',
+            is_staff=True)
+        category = Category.objects.create(name='Electronics')
+        client = APIClient()
+        client.force_authenticate(staff)
+        body = MessagePackRenderer().render({
+            'name': 'Packed', 'description': 'Sent as MessagePack',
+            'price': '12.50', 'brand': 'Acme', 'stock_quantity': 3,
+            'category_id': str(category.pk), 'specifications': {'weight': 2},
+        })
+
+        response = client.post(
+            reverse('products:product-list'), body,
+            content_type='application/msgpack',
+            HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        product = Product.objects.get(name='Packed')
+        self.assertEqual(product.stock_quantity, 3)
+
+
+class GetOrComputeTestCase(SimpleTestCase):
+    key = 'test:get-or-compute'
+    lock_key = 'test:get-or-compute:lock'
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self, value='fresh'):
+        def compute():
+            self.calls += 1
+            return value
+        return compute
+
+    def cache_stale(self, value='stale'):
+        cache.set(self.key, {'value': value, 'refresh_at': time.time() - 1},
+                  timeout=60)
+
+    def test_fresh_entry_is_served_without_computing(self):
+        get_or_compute(self.key, self.compute(), timeout=60)
+
+        value = get_or_compute(self.key, self.compute('other'), timeout=60)
+
+        self.assertEqual(value, 'fresh')
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_entry_is_served_while_another_worker_recomputes(self):
+        self.cache_stale()
+        cache.add(self.lock_key, 1)
+
+        value = get_or_compute(self.key, self.compute(), timeout=60)
+
+        self.assertEqual(value, 'stale')
+        self.assertEqual(self.calls, 0)
+
+    def test_leader_recomputes_after_refresh_deadline(self):
+        self.cache_stale()
+
+        value = get_or_compute(self.key, self.compute(), timeout=60)
+
+        self.assertEqual(value, 'fresh')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(cache.get(self.key)['value'], 'fresh')
+        self.assertIsNone(cache.get(self.lock_key))
+
+    def test_cold_miss_computes_once_the_wait_runs_out(self):
+        cache.add(self.lock_key, 1)
+
+        value = get_or_compute(self.key, self.compute(), timeout=60,
+                               wait=0.01, poll_interval=0.005)
+
+        self.assertEqual(value, 'fresh')
+        self.assertIsNone(cache.get(self.key))
+
+    def test_lock_is_released_when_compute_raises(self):
+        def fail():
+            raise RuntimeError('backend down')
+
+        with self.assertRaises(RuntimeError):
+            get_or_compute(self.key, fail, timeout=60)
+
+        self.assertIsNone(cache.get(self.lock_key))
+        self.assertEqual(
+            get_or_compute(self.key, self.compute(), timeout=60), 'fresh')
+
+
+class CountingView(APIView):
+    calls = 0
+
+    def get(self, request):
+        CountingView.calls += 1
+        user = request.user
+        return Response({
+            'user': user.pk if user.is_authenticated else None,
+            'call': CountingView.calls,
+        })
+
+
+def cached_view(vary_on):
+    class CachedView(CountingView):
+        @cache_response(tags=('test',), vary_on=vary_on)
+        def get(self, request):
+            return super().get(request)
+
+    return CachedView.as_view()
+
+
+class CacheResponseTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob = [
+            User.objects.create_user(username=name,
+                                     email=f'{name}@example.com',
+                                     password='test123!')
+            for name in ('alice', 'bob')
+        ]
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='test123!',
+            role='admin')
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+
+    def get(self, view, user=None):
+        request = self.factory.get('/cached/')
+        if user is not None:
+            force_authenticate(request, user=user)
+        return view(request).data
+
+    def test_shared_entry_by_default(self):
+        view = cached_view(None)
+
+        first = self.get(view, self.alice)
+
+        self.assertEqual(self.get(view, self.bob), first)
+        self.assertEqual(self.get(view), first)
+
+    def test_vary_on_user_never_serves_another_users_entry(self):
+        view = cached_view('user')
+
+        alice = self.get(view, self.alice)
+        bob = self.get(view, self.bob)
+        anonymous = self.get(view)
+
+        self.assertEqual(alice['user'], self.alice.pk)
+        self.assertEqual(bob['user'], self.bob.pk)
+        self.assertIsNone(anonymous['user'])
+        # Repeat requests are hits on each caller's own entry
+        self.assertEqual(self.get(view, self.alice), alice)
+        self.assertEqual(self.get(view, self.bob), bob)
+
+    def test_vary_on_role_shares_entries_within_a_role(self):
+        view = cached_view('role')
+
+        customer = self.get(view, self.alice)
+
+        self.assertEqual(self.get(view, self.bob), customer)
+        self.assertNotEqual(self.get(view, self.admin), customer)
+
+    def test_invalidating_a_tag_retires_entries(self):
+        view = cached_view('user')
+        first = self.get(view, self.alice)
+
+        invalidate_cache_tags('test')
+
+        second = self.get(view, self.alice)
+        self.assertNotEqual(second['call'], first['call'])
+        self.assertEqual(self.get(view, self.alice), second)
+
+
+class PurgeIdempotencyKeysTestCase(TestCase):
+    def test_deletes_only_keys_past_the_replay_window(self):
+        expired = IdempotencyKey.objects.create(key='expired', request_hash='x')
+        IdempotencyKey.objects.filter(pk=expired.pk).update(
+            created_at=timezone.now() - datetime.timedelta(
+                seconds=REPLAY_TIMEOUT + 60))
+        IdempotencyKey.objects.create(key='current', request_hash='x')
+
+        call_command('purge_idempotency_keys', stdout=io.StringIO())
+
+        self.assertEqual(
+            list(IdempotencyKey.objects.values_list('key', flat=True)),
+            ['current'])
@@ -1,5 +1,14 @@
+import base64
+import json
+from django.core.cache import cache
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class IsAdminOrReadOnly(IsAuthenticatedOrReadOnly):
@@ -9,7 +18,159 @@ class IsAdminOrReadOnly(IsAuthenticatedOrReadOnly):
         return request.user.is_authenticated and request.user.is_staff
 
 
+class CachedCountPaginator(DjangoPaginator):
+    """Django paginator that memoizes COUNT(*) under a cache key"""
+
+    def __init__(self, *args, count_cache_key=None, count_timeout=900,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_cache_key = count_cache_key
+        self.count_timeout = count_timeout
+
+    @cached_property
+    def count(self):
+        if self.count_cache_key is None:
+            return super().count
+
+        count = cache.get(self.count_cache_key)
+        if count is None:
+            count = super().count
+            cache.set(self.count_cache_key, count, timeout=self.count_timeout)
+        return count
+
+
 class ProductPagination(PageNumberPagination):
-    page_size = 5
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    # Set per request to share one COUNT(*) across every page of a filter
+    count_cache_key = None
+
+    def django_paginator_class(self, object_list, per_page):
+        return CachedCountPaginator(
+            object_list, per_page, count_cache_key=self.count_cache_key)
+
+
+class ProductCursorPagination(BasePagination):
+    """
+    Keyset pagination for the product list.
+
+    The cursor holds the ordering value and id of the row at the edge of the
+    current page, so every page is a range scan on the sort column with `id`
+    as a tiebreak instead of an OFFSET plus COUNT(*) over the whole result.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+    orderings = {
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+        '-rating': ('-rating', '-id'),
+        '-created_at': ('-created_at', '-id'),
+    }
+    default_ordering = '-created_at'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        ordering = request.query_params.get('ordering')
+        if ordering not in self.orderings:
+            ordering = self.default_ordering
+        self.ordering = self.orderings[ordering]
+        self.field_name = self.ordering[0].lstrip('-')
+        self.field = queryset.model._meta.get_field(self.field_name)
+
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor['reverse']
+
+        if reverse:
+            queryset = queryset.order_by(
+                *[self._flip(field) for field in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if cursor is not None:
+            queryset = queryset.filter(
+                self._after(cursor['position'], cursor['id'], reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, cursor is not None
+
+        self.next_item = results[-1] if has_next and results else None
+        self.previous_item = results[0] if has_previous and results else None
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if self.next_item is None:
+            return None
+        return self.encode_cursor(self.next_item, reverse=False)
+
+    def get_previous_link(self):
+        if self.previous_item is None:
+            return None
+        return self.encode_cursor(self.previous_item, reverse=True)
+
+    def encode_cursor(self, item, reverse):
+        payload = {
+            'p': self.field.value_to_string(item),
+            'id': str(item.pk),
+            'r': int(reverse),
+        }
+        encoded = base64.urlsafe_b64encode(
+            json.dumps(payload).encode()).decode()
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            return {
+                'position': self.field.to_python(payload['p']),
+                'id': payload['id'],
+                'reverse': bool(payload['r']),
+            }
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def _after(self, position, pk, reverse):
+        descending = self.ordering[0].startswith('-') != reverse
+        lookup = 'lt' if descending else 'gt'
+        return (
+            Q(**{f'{self.field_name}__{lookup}': position}) |
+            Q(**{self.field_name: position, f'pk__{lookup}': pk})
+        )
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
@@ -0,0 +1,82 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+from cart.models import Cart, CartItem
+from products.models import Product, ProductImage
+from users.models import User
+from orders.views import CreateOrderView
+
+
+class Command(BaseCommand):
+    help = ("Measure CreateOrderView latency and query count by cart size. "
+            "Runs in a transaction that is rolled back, leaving no data.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,20,200',
+                            help="Comma-separated cart sizes to check out.")
+        parser.add_argument('--iterations', type=int, default=20,
+                            help="Checkouts timed per cart size.")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        iterations = options['iterations']
+
+        with transaction.atomic():
+            self.run(sizes, iterations)
+            transaction.set_rollback(True)
+
+    def run(self, sizes, iterations):
+        products = Product.objects.bulk_create([
+            Product(name=f'Checkout benchmark product {i}',
+                    description='Benchmark product', price='19.99',
+                    brand='Acme', stock_quantity=10 ** 6)
+            for i in range(max(sizes))
+        ])
+        ProductImage.objects.bulk_create([
+            ProductImage(product=product, image=f'products/{product.pk}',
+                         is_main=True)
+            for product in products
+        ])
+
+        factory = APIRequestFactory()
+        view = CreateOrderView.as_view()
+        payload = {'shipping_address': {'street': '1 Main St',
+                                        'city': 'Springfield'}}
+
+        self.stdout.write(f"{iterations} checkouts per cart size")
+        for size in sizes:
+            timings, query_counts = [], set()
+            for i in range(iterations):
+                # A fresh cart each time, so no cached totals carry over
+                user = User.objects.create_user(
+                    username=f'checkout-benchmark-{size}-{i}',
+                    email=f'checkout-benchmark-{size}-{i}@example.com',
+                    password=None)
+                cart = Cart.objects.create(user=user)
+                CartItem.objects.bulk_create([
+                    CartItem(cart=cart, product=product, quantity=2)
+                    for product in products[:size]
+                ])
+                request = factory.post('/api/v1/orders/create/', payload,
+                                       format='json')
+                force_authenticate(request, user=user)
+
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    response = view(request)
+                    response.render()
+                    timings.append((time.perf_counter() - start) * 1000)
+
+                if response.status_code != 201:
+                    self.stderr.write(self.style.ERROR(
+                        f"Checkout failed: {response.data}"))
+                    return
+                query_counts.add(len(queries))
+
+            self.stdout.write(
+                f"{size:>4} items {statistics.median(timings):9.2f} ms median "
+                f"{min(timings):9.2f} ms min "
+                f"{'/'.join(map(str, sorted(query_counts))):>5} queries")
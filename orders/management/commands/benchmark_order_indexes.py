@@ -0,0 +1,186 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from products.models import Product
+from reviews.models import Review
+from users.models import User
+from orders.models import Order
+
+
+PREFIX = 'index-benchmark'
+
+# Status mix of a shop that has been trading for a while
+STATUS_WEIGHTS = {
+    'delivered': 70,
+    'cancelled': 10,
+    'shipped': 10,
+    'processing': 5,
+    'pending': 5,
+}
+
+# The indexes added for these access paths, and what they replaced
+NEW_INDEXES = [
+    (Order, 'order_user_created_idx'),
+    (Order, 'order_status_created_idx'),
+    (Review, 'review_product_created_idx'),
+]
+OLD_INDEXES = [
+    (Review, models.Index(fields=['product'],
+                          name='reviews_rev_product_a9ee0d_idx')),
+]
+
+
+class Command(BaseCommand):
+    help = ("Seed a large order and review history and compare query plans "
+            "and latency of the order list, status filter and product "
+            "reviews with and without their composite indexes. Seeded data "
+            "is kept for later runs until --cleanup is passed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1_000_000,
+                            help="Orders to seed.")
+        parser.add_argument('--users', type=int, default=10_000,
+                            help="Customers the orders are spread over.")
+        parser.add_argument('--reviews', type=int, default=200_000,
+                            help="Reviews to seed.")
+        parser.add_argument('--products', type=int, default=100,
+                            help="Products the reviews are spread over.")
+        parser.add_argument('--iterations', type=int, default=50,
+                            help="Runs timed per query.")
+        parser.add_argument('--batch-size', type=int, default=10_000,
+                            help="Rows per INSERT while seeding.")
+        parser.add_argument('--cleanup', action='store_true',
+                            help="Delete the seeded data and exit.")
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            self.cleanup()
+            return
+
+        users, products = self.seed(options)
+        queries = {
+            'orders by user': lambda: Order.objects.filter(
+                user_id=random.choice(users)).order_by('-created_at')[:10],
+            'orders by status': lambda: Order.objects.filter(
+                status='pending').order_by('-created_at')[:10],
+            'reviews by product': lambda: Review.objects.filter(
+                product_id=random.choice(products))[:20],
+        }
+
+        # The indexes are dropped for `before` and restored by the rollback;
+        # SQLite only alters schema in a transaction with FK checks off
+        with connection.constraint_checks_disabled(), transaction.atomic():
+            before = self.measure(queries, options['iterations'], 'before')
+            transaction.set_rollback(True)
+        after = self.measure(queries, options['iterations'], 'after')
+
+        self.stdout.write("\nMedian latency")
+        for name in queries:
+            self.stdout.write(
+                f"{name:<20} {before[name]:9.2f} ms before "
+                f"{after[name]:9.2f} ms after "
+                f"{before[name] / max(after[name], 1e-6):7.1f}x")
+
+    def measure(self, queries, iterations, label):
+        """Time each query, dropping the new indexes first for `before`"""
+        if label == 'before':
+            with connection.schema_editor() as schema_editor:
+                for model, name in NEW_INDEXES:
+                    index, = [index for index in model._meta.indexes
+                              if index.name == name]
+                    schema_editor.remove_index(model, index)
+                for model, index in OLD_INDEXES:
+                    schema_editor.add_index(model, index)
+            self.analyze()
+
+        self.stdout.write(f"\n=== {label} ===")
+        medians = {}
+        for name, build in queries.items():
+            self.stdout.write(f"\n{name}:")
+            self.stdout.write(self.explain(build()))
+
+            timings = []
+            for _ in range(iterations):
+                queryset = build()
+                start = time.perf_counter()
+                list(queryset)
+                timings.append((time.perf_counter() - start) * 1000)
+            medians[name] = statistics.median(timings)
+        return medians
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            return queryset.explain(analyze=True, buffers=True)
+        return queryset.explain()
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            for model in (Order, Review):
+                cursor.execute(
+                    f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+
+    def seed(self, options):
+        users = list(User.objects.filter(
+            username__startswith=PREFIX).values_list('pk', flat=True))
+        products = list(Product.objects.filter(
+            name__startswith=PREFIX).values_list('pk', flat=True))
+        if users and products:
+            self.stdout.write(
+                f"Reusing {len(users)} seeded customers and "
+                f"{len(products)} products; pass --cleanup to reseed")
+            return users, products
+
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+        users = [user.pk for user in User.objects.bulk_create([
+            User(username=f'{PREFIX}-{i}',
+                 email=f'{PREFIX}-{i}@example.com')
+            for i in range(options['users'])
+        ], batch_size=batch_size)]
+        products = [product.pk for product in Product.objects.bulk_create([
+            Product(name=f'{PREFIX} product {i}', description='Benchmark',
+                    price='9.99', brand='Acme')
+            for i in range(options['products'])
+        ])]
+
+        statuses = list(STATUS_WEIGHTS)
+        weights = list(STATUS_WEIGHTS.values())
+        for offset in range(0, options['orders'], batch_size):
+            count = min(batch_size, options['orders'] - offset)
+            Order.objects.bulk_create([
+                Order(user_id=random.choice(users), total_amount='49.99',
+                      status=status,
+                      shipping_address={'street': '1 Main St'})
+                for status in random.choices(statuses, weights, k=count)
+            ])
+            self.stdout.write(f"\rSeeded {offset + count} orders", ending='')
+        self.stdout.write("")
+
+        for offset in range(0, options['reviews'], batch_size):
+            count = min(batch_size, options['reviews'] - offset)
+            Review.objects.bulk_create([
+                Review(product_id=random.choice(products),
+                       user_id=random.choice(users),
+                       rating=random.randint(1, 5), comment='Benchmark')
+                for _ in range(count)
+            ])
+
+        self.analyze()
+        self.stdout.write(
+            f"Seeded in {time.perf_counter() - started:.1f} s")
+        return users, products
+
+    def cleanup(self):
+        users = list(User.objects.filter(
+            username__startswith=PREFIX).values_list('pk', flat=True))
+        # Batched so the delete collector never holds every order at once
+        for offset in range(0, len(users), 100):
+            batch = users[offset:offset + 100]
+            Order.objects.filter(user_id__in=batch).delete()
+            Review.objects.filter(user_id__in=batch).delete()
+            User.objects.filter(pk__in=batch).delete()
+        Product.objects.filter(name__startswith=PREFIX).delete()
+        self.stdout.write(f"Deleted {len(users)} seeded customers and their "
+                          f"orders and reviews")
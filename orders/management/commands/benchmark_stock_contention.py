@@ -0,0 +1,146 @@
+import random
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from rest_framework.test import APIRequestFactory, force_authenticate
+from cart.models import Cart, CartItem
+from products.models import Product
+from users.models import User
+from orders.models import Order, OrderItem
+from orders.views import CreateOrderView
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = ("Run many concurrent checkouts against a few products and report "
+            "throughput, product lock waits and whether stock was oversold. "
+            "Needs a database with row locks and concurrent connections "
+            "(Postgres); the data it creates is deleted afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=200,
+                            help="Carts checked out concurrently.")
+        parser.add_argument('--workers', type=int, default=16,
+                            help="Concurrent checkout threads.")
+        parser.add_argument('--skus', type=int, default=3,
+                            help="Products every cart draws from.")
+        parser.add_argument('--stock', type=int, default=100,
+                            help="Starting stock of each product.")
+
+    def handle(self, *args, **options):
+        if not connection.features.has_select_for_update:
+            self.stderr.write(self.style.WARNING(
+                f"{connection.vendor} has no row locks; lock waits are not "
+                f"measured and writers are serialized by the database."))
+
+        prefix = f"contention-{uuid.uuid4().hex[:8]}"
+        products = Product.objects.bulk_create([
+            Product(name=f'{prefix} product {i}', description='Benchmark',
+                    price='9.99', brand='Acme',
+                    stock_quantity=options['stock'])
+            for i in range(options['skus'])
+        ])
+        users = []
+        try:
+            users = self.create_carts(prefix, products, options['checkouts'])
+            results, elapsed = self.check_out(users, options['workers'])
+            self.report(products, options['stock'], results, elapsed)
+        finally:
+            Order.objects.filter(user__in=users).delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            Product.objects.filter(pk__in=[p.pk for p in products]).delete()
+
+    def create_carts(self, prefix, products, count):
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}-{i}', email=f'{prefix}-{i}@example.com')
+            for i in range(count)
+        ])
+        carts = Cart.objects.bulk_create([Cart(user=user) for user in users])
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product,
+                     quantity=random.randint(1, 3))
+            for cart in carts
+            for product in random.sample(products, min(2, len(products)))
+        ])
+        return users
+
+    def check_out(self, users, workers):
+        factory = APIRequestFactory()
+        view = CreateOrderView.as_view()
+        payload = {'shipping_address': {'street': '1 Main St',
+                                        'city': 'Springfield'}}
+
+        def checkout(user):
+            lock_waits = []
+
+            def time_product_locks(execute, sql, params, many, context):
+                if 'FOR UPDATE' not in sql or 'products_product' not in sql:
+                    return execute(sql, params, many, context)
+                start = time.perf_counter()
+                try:
+                    return execute(sql, params, many, context)
+                finally:
+                    lock_waits.append((time.perf_counter() - start) * 1000)
+
+            request = factory.post('/api/v1/orders/create/', payload,
+                                   format='json')
+            force_authenticate(request, user=user)
+            try:
+                with connection.execute_wrapper(time_product_locks):
+                    start = time.perf_counter()
+                    response = view(request)
+                    latency = (time.perf_counter() - start) * 1000
+                return response, latency, lock_waits
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(checkout, users))
+        return results, time.perf_counter() - start
+
+    def report(self, products, stock, results, elapsed):
+        statuses = [response.status_code for response, _, _ in results]
+        errors = {response.data.get('error') for response, _, _ in results
+                  if response.status_code >= 500}
+        latencies = [latency for _, latency, _ in results]
+        lock_waits = [wait for _, _, waits in results for wait in waits]
+
+        self.stdout.write(
+            f"{len(results)} checkouts in {elapsed:.2f} s "
+            f"({len(results) / elapsed:.1f}/s): "
+            f"{statuses.count(201)} placed, {statuses.count(400)} out of "
+            f"stock, {len(statuses) - statuses.count(201) - statuses.count(400)} "
+            f"failed")
+        self.stdout.write(
+            f"latency   p50 {percentile(latencies, 0.5):8.2f} ms  "
+            f"p95 {percentile(latencies, 0.95):8.2f} ms  "
+            f"max {max(latencies, default=0):8.2f} ms")
+        for error in errors:
+            self.stderr.write(self.style.ERROR(f"failure: {error}"))
+        if lock_waits:
+            self.stdout.write(
+                f"lock wait p50 {percentile(lock_waits, 0.5):8.2f} ms  "
+                f"p95 {percentile(lock_waits, 0.95):8.2f} ms  "
+                f"max {max(lock_waits):8.2f} ms  "
+                f"mean {statistics.mean(lock_waits):8.2f} ms")
+
+        for product in Product.objects.filter(
+                pk__in=[p.pk for p in products]).order_by('name'):
+            sold = OrderItem.objects.filter(product=product).aggregate(
+                sold=Coalesce(Sum('quantity'), 0))['sold']
+            oversold = sold > stock or product.stock_quantity != stock - sold
+            self.stdout.write(
+                f"{product.name}: sold {sold}, {product.stock_quantity} left"
+                + (self.style.ERROR("  OVERSOLD") if oversold else ""))
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.19 on 2026-10-18 10:01
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def snapshot_products(apps, schema_editor):
+    """Copy each existing item's current product details onto the item"""
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Product = apps.get_model('products', 'Product')
+    ProductImage = apps.get_model('products', 'ProductImage')
+
+    product = Product.objects.filter(pk=OuterRef('product_id'))
+    OrderItem.objects.update(
+        product_name=Subquery(product.values('name')[:1]),
+        product_price=Subquery(product.values('price')[:1]),
+    )
+
+    ordered = OrderItem.objects.values('product_id').distinct()
+    main_images = ProductImage.objects.filter(
+        is_main=True, product_id__in=ordered)
+    for main_image in main_images.iterator():
+        if main_image.image:
+            OrderItem.objects.filter(product_id=main_image.product_id).update(
+                product_image=main_image.image.url)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_remove_order_payment_method'),
+        ('products', '0017_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_image',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(snapshot_products, migrations.RunPython.noop),
+    ]
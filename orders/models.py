@@ -4,6 +4,12 @@ from django.conf import settings
 from products.models import Product
 
 
+class OrderQuerySet(models.QuerySet):
+    def with_items(self):
+        """Prefetch items, which carry their product snapshot, in one query"""
+        return self.prefetch_related('items')
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -21,15 +27,28 @@ class Order(models.Model):
         max_length=20, choices=STATUS_CHOICES, default='pending'
     )
     shipping_address = models.JSONField()
+    # Whether checkout took the items out of stock; orders placed before
+    # stock was reserved have nothing to give back when cancelled
+    stock_reserved = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderQuerySet.as_manager()
+
     def __str__(self):
         return f"Order {self.id} by {self.user}"
 
     class Meta:
         verbose_name = "Order"
         verbose_name_plural = "Orders"
+        indexes = [
+            # A customer's orders, newest first
+            models.Index(fields=['user', '-created_at'],
+                         name='order_user_created_idx'),
+            # Admin views of orders in a status, newest first
+            models.Index(fields=['status', '-created_at'],
+                         name='order_status_created_idx'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -39,6 +58,12 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Snapshot of the product as it was bought, so order reads never join
+    # products or build image URLs
+    product_name = models.CharField(max_length=255, blank=True)
+    product_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True)
+    product_image = models.URLField(max_length=500, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -3,11 +3,7 @@ from .models import OrderItem, Order
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product_id = serializers.UUIDField(source='product.id')
-    product_name = serializers.CharField(source='product.name', read_only=True)
-    product_price = serializers.DecimalField(
-        source='product.price', read_only=True, max_digits=10, decimal_places=2
-    )
+    product_id = serializers.UUIDField(read_only=True)
     product_image = serializers.SerializerMethodField()
 
     class Meta:
@@ -19,10 +15,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
                             'product_price', 'product_image']
 
     def get_product_image(self, obj):
-        main_image = obj.product.product_images.filter(is_main=True).first()
-        if main_image and main_image.image:
-            return main_image.image.url
-        return None
+        return obj.product_image or None
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -37,3 +30,32 @@ class OrderSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'user', 'created_at',
                             'updated_at', 'items', 'total_amount']
+
+
+class OrderFilterSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES,
+                                     required=False)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if not data:
+            raise serializers.ValidationError(
+                "Give at least one of status, created_after or created_before.")
+        return data
+
+
+class BulkOrderStatusSerializer(serializers.Serializer):
+    MAX_ORDERS = 10000
+
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    ids = serializers.ListField(
+        child=serializers.UUIDField(), required=False, allow_empty=False,
+        max_length=MAX_ORDERS)
+    filter = OrderFilterSerializer(required=False)
+
+    def validate(self, data):
+        if ('ids' in data) == ('filter' in data):
+            raise serializers.ValidationError(
+                "Give exactly one of ids or filter.")
+        return data
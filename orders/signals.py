@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+
+# Sent with `order_ids` and `status` once orders have moved to `status` and
+# the transaction that moved them has committed
+order_status_changed = Signal()
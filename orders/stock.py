@@ -0,0 +1,88 @@
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from products.cache import bump_product_versions
+from products.models import Product
+from .models import OrderItem
+
+
+class InsufficientStock(Exception):
+    """Raised when a checkout asks for more units than are in stock"""
+
+    def __init__(self, shortages):
+        super().__init__("Insufficient stock.")
+        self.shortages = shortages
+
+
+def reserve_stock(lines):
+    """
+    Lock the products of `lines` and take their quantities out of stock.
+
+    `lines` are cart or order lines with `product_id` and `quantity`. Must run
+    inside a transaction. Products are locked in id order, so concurrent
+    checkouts over overlapping products queue up instead of deadlocking, and
+    all decrements are made in one UPDATE. Returns the locked products by id;
+    raises InsufficientStock, reserving nothing, if any line is short.
+    """
+    quantities = {}
+    for line in lines:
+        quantities[line.product_id] = (
+            quantities.get(line.product_id, 0) + line.quantity)
+
+    products = {
+        product.pk: product
+        for product in Product.objects.select_for_update()
+        .filter(pk__in=quantities).order_by('pk')
+    }
+
+    shortages = [
+        {
+            "product_id": str(product_id),
+            "name": products[product_id].name if product_id in products else None,
+            "requested": quantity,
+            "available": (products[product_id].stock_quantity
+                          if product_id in products else 0),
+        }
+        for product_id, quantity in quantities.items()
+        if product_id not in products
+        or products[product_id].stock_quantity < quantity
+    ]
+    if shortages:
+        raise InsufficientStock(shortages)
+
+    Product.objects.filter(pk__in=quantities).update(
+        stock_quantity=F('stock_quantity') - Case(
+            *[When(pk=product_id, then=Value(quantity))
+              for product_id, quantity in quantities.items()],
+            output_field=IntegerField()))
+    bump_product_versions(quantities)
+    for product_id, quantity in quantities.items():
+        products[product_id].stock_quantity -= quantity
+    return products
+
+
+def release_stock(order_ids):
+    """
+    Put the units of the orders' items back in stock.
+
+    Used when orders are cancelled; must run in the transaction that
+    cancels them. Only orders whose checkout reserved stock give units back.
+    Quantities are summed per product, the products are locked in id order
+    like reserve_stock does, so a cancel and a checkout cannot deadlock, and
+    the units are added back in one UPDATE.
+    """
+    quantities = dict(
+        OrderItem.objects.filter(
+            order_id__in=order_ids, order__stock_reserved=True).order_by()
+        .values('product_id').annotate(total=Sum('quantity'))
+        .values_list('product_id', 'total'))
+    if not quantities:
+        return
+
+    list(Product.objects.select_for_update()
+         .filter(pk__in=quantities).order_by('pk').values_list('pk', flat=True))
+
+    Product.objects.filter(pk__in=quantities).update(
+        stock_quantity=F('stock_quantity') + Case(
+            *[When(pk=product_id, then=Value(quantity))
+              for product_id, quantity in quantities.items()],
+            output_field=IntegerField()))
+    bump_product_versions(quantities)
@@ -1,3 +1,474 @@
+import uuid
+from unittest import mock
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from cart.models import Cart, CartItem
+from categories.models import Category
+from products.models import Product, ProductImage
+from users.models import User
+from .models import Order
+from .signals import order_status_changed
+from .transitions import transition_order
 
-# Create your tests here.
+
+class CreateOrderTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='shopper', email='shopper@example.com', password='test123!')
+        category = Category.objects.create(name='Electronics')
+        cls.full_price = Product.objects.create(
+            name='Full Price', description='Test product', price='10.00',
+            category=category, brand='Acme', stock_quantity=10)
+        cls.discounted = Product.objects.create(
+            name='Discounted', description='Test product', price='20.00',
+            discounted_price='15.00', category=category, brand='Acme',
+            stock_quantity=3)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('orders:create-order')
+        self.shipping_address = {'street': '1 Main St', 'city': 'Springfield'}
+
+    def test_checkout_charges_cart_totals(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.full_price, quantity=2)
+        CartItem.objects.create(cart=cart, product=self.discounted, quantity=3)
+
+        response = self.client.post(
+            self.url, {'shipping_address': self.shipping_address}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.total_amount, Decimal('65.00'))
+        prices = dict(order.items.values_list('product_id', 'price'))
+        self.assertEqual(prices, {
+            self.full_price.pk: Decimal('10.00'),
+            self.discounted.pk: Decimal('15.00'),
+        })
+
+        # Renaming the product later does not change what was bought
+        Product.objects.filter(pk=self.discounted.pk).update(name='Renamed')
+        response = self.client.get(
+            reverse('orders:order-details', kwargs={'order_id': order.id}))
+        names = {item['product_name'] for item in response.data['order']['items']}
+        self.assertEqual(names, {'Full Price', 'Discounted'})
+        item = order.items.get(product=self.discounted)
+        self.assertEqual(item.product_price, Decimal('20.00'))
+        self.assertFalse(CartItem.objects.filter(cart=cart).exists())
+
+    def test_checkout_total_ignores_stale_cached_totals(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.full_price, quantity=2)
+        self.client.get(reverse('cart:cart-detail'))
+
+        # A price write that does not retire the cached cart totals
+        Product.objects.filter(pk=self.full_price.pk).update(price='12.00')
+        self.client.post(
+            self.url, {'shipping_address': self.shipping_address}, format='json')
+
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.total_amount, Decimal('24.00'))
+        self.assertEqual(order.items.get().price, Decimal('12.00'))
+
+    def test_checkout_reserves_stock(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.full_price, quantity=4)
+        CartItem.objects.create(cart=cart, product=self.discounted, quantity=3)
+
+        self.client.post(
+            self.url, {'shipping_address': self.shipping_address}, format='json')
+
+        self.full_price.refresh_from_db()
+        self.discounted.refresh_from_db()
+        self.assertEqual(self.full_price.stock_quantity, 6)
+        self.assertEqual(self.discounted.stock_quantity, 0)
+
+    def test_cancelling_puts_stock_back(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.full_price, quantity=4)
+        self.client.post(
+            self.url, {'shipping_address': self.shipping_address}, format='json')
+        order = Order.objects.get(user=self.user)
+
+        self.client.patch(
+            reverse('orders:cancel-order', kwargs={'order_id': order.id}))
+        # A repeated cancel does not put the units back twice
+        self.client.patch(
+            reverse('orders:cancel-order', kwargs={'order_id': order.id}))
+
+        self.full_price.refresh_from_db()
+        self.assertEqual(self.full_price.stock_quantity, 10)
+
+    def test_checkout_rejects_insufficient_stock(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.full_price, quantity=1)
+        CartItem.objects.create(cart=cart, product=self.discounted, quantity=4)
+
+        response = self.client.post(
+            self.url, {'shipping_address': self.shipping_address}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors']['out_of_stock'], [{
+            'product_id': str(self.discounted.pk),
+            'name': 'Discounted',
+            'requested': 4,
+            'available': 3,
+        }])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.filter(cart=cart).count(), 2)
+        self.full_price.refresh_from_db()
+        self.assertEqual(self.full_price.stock_quantity, 10)
+
+    def test_checkout_rejects_empty_cart(self):
+        Cart.objects.create(user=self.user)
+
+        response = self.client.post(
+            self.url, {'shipping_address': self.shipping_address}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Order.objects.exists())
+
+    def test_repeated_idempotency_key_replays_the_order(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.full_price, quantity=1)
+        data = {'shipping_address': self.shipping_address}
+
+        first = self.client.post(self.url, data, format='json',
+                                 HTTP_IDEMPOTENCY_KEY='checkout-1')
+        # Drop the cached copy to replay from the database record
+        cache.clear()
+        second = self.client.post(self.url, data, format='json',
+                                  HTTP_IDEMPOTENCY_KEY='checkout-1')
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_idempotency_key_reused_with_another_body_is_rejected(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.full_price, quantity=1)
+
+        self.client.post(self.url, {'shipping_address': self.shipping_address},
+                         format='json', HTTP_IDEMPOTENCY_KEY='checkout-1')
+        response = self.client.post(
+            self.url, {'shipping_address': {'street': '2 Elm St'}},
+            format='json', HTTP_IDEMPOTENCY_KEY='checkout-1')
+
+        self.assertEqual(response.status_code,
+                         status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def checkout_queries(self, size):
+        user = User.objects.create_user(
+            username=f'shopper-{size}', email=f'shopper-{size}@example.com',
+            password='test123!')
+        cart = Cart.objects.create(user=user)
+        for i in range(size):
+            product = Product.objects.create(
+                name=f'Product {size}-{i}', description='Test product',
+                price='10.00', brand='Acme', stock_quantity=1)
+            ProductImage.objects.create(
+                product=product, image=f'products/{i}-main', is_main=True)
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                self.url, {'shipping_address': self.shipping_address},
+                format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['order']['items']), size)
+        for item in response.data['order']['items']:
+            self.assertIn('-main', item['product_image'])
+        return len(queries)
+
+    def test_checkout_queries_do_not_grow_with_cart(self):
+        self.assertEqual(self.checkout_queries(1), self.checkout_queries(20))
+
+
+class OrderReadQueryCountTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='test123!',
+            role='admin')
+        cls.customer = User.objects.create_user(
+            username='shopper', email='shopper@example.com', password='test123!')
+        products = []
+        for i in range(5):
+            product = Product.objects.create(
+                name=f'Product {i}', description='Test product',
+                price='10.00', brand='Acme')
+            ProductImage.objects.create(
+                product=product, image=f'products/{i}-main', is_main=True)
+            products.append(product)
+
+        for i in range(10):
+            order = Order.objects.create(
+                user=cls.customer, total_amount='50.00',
+                shipping_address={'street': '1 Main St'})
+            for product in products:
+                order.items.create(
+                    product=product, quantity=1, price='10.00',
+                    product_name=product.name, product_price='10.00',
+                    product_image=f'https://example.com/{product.pk}-main.jpg')
+        cls.order = order
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_list_queries(self):
+        for user in (self.admin, self.customer):
+            self.client.force_authenticate(user)
+            # COUNT(*), orders, and items
+            with self.assertNumQueries(3):
+                response = self.client.get(reverse('orders:list-orders'))
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['results']), 10)
+            for order in response.data['results']:
+                self.assertEqual(len(order['items']), 5)
+                for item in order['items']:
+                    self.assertEqual(item['product_name'][:8], 'Product ')
+                    self.assertIn('-main', item['product_image'])
+
+    def test_list_filters_by_status(self):
+        Order.objects.filter(pk=self.order.pk).update(status='shipped')
+        self.client.force_authenticate(self.admin)
+
+        response = self.client.get(
+            reverse('orders:list-orders'), {'status': 'shipped'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([order['id'] for order in response.data['results']],
+                         [str(self.order.pk)])
+
+        response = self.client.get(
+            reverse('orders:list-orders'), {'status': 'lost'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_detail_queries(self):
+        self.client.force_authenticate(self.customer)
+        url = reverse('orders:order-details', kwargs={'order_id': self.order.id})
+
+        # The order and its items
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['order']['items']), 5)
+
+
+class BulkUpdateOrderStatusTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='test123!',
+            role='admin')
+        cls.customer = User.objects.create_user(
+            username='customer', email='customer@example.com',
+            password='test123!')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.url = reverse('orders:bulk-update-order-status')
+
+    def create_orders(self, count, order_status='processing'):
+        return Order.objects.bulk_create([
+            Order(user=self.customer, total_amount='10.00',
+                  status=order_status, shipping_address={})
+            for _ in range(count)
+        ])
+
+    def test_updates_by_id_and_reports_each_order(self):
+        processing = self.create_orders(2)
+        delivered, = self.create_orders(1, 'delivered')
+        missing = uuid.uuid4()
+        ids = [str(order.pk) for order in processing + [delivered]]
+
+        response = self.client.post(
+            self.url, {'status': 'shipped', 'ids': ids + [str(missing)]},
+            format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 2)
+        results = {str(result['id']): result
+                   for result in response.data['results']}
+        for order in processing:
+            self.assertTrue(results[str(order.pk)]['updated'])
+            self.assertEqual(results[str(order.pk)]['previous_status'],
+                             'processing')
+        self.assertFalse(results[str(delivered.pk)]['updated'])
+        self.assertEqual(results[str(delivered.pk)]['status'], 'delivered')
+        self.assertEqual(results[str(missing)]['error'], 'Order not found.')
+        self.assertEqual(
+            Order.objects.filter(status='shipped').count(), 2)
+
+    def test_updates_by_filter(self):
+        self.create_orders(3)
+        self.create_orders(2, 'pending')
+
+        response = self.client.post(
+            self.url, {'status': 'shipped', 'filter': {'status': 'processing'}},
+            format='json')
+
+        self.assertEqual(response.data['updated'], 3)
+        self.assertEqual(Order.objects.filter(status='pending').count(), 2)
+
+    def test_query_count_does_not_grow_with_orders(self):
+        for count in (5, 50):
+            ids = [str(order.pk) for order in self.create_orders(count)]
+            # Savepoint, locked read, UPDATE, release
+            with self.assertNumQueries(4):
+                response = self.client.post(
+                    self.url, {'status': 'shipped', 'ids': ids}, format='json')
+            self.assertEqual(response.data['updated'], count)
+
+    def test_rejects_ambiguous_selection_and_non_admins(self):
+        response = self.client.post(
+            self.url, {'status': 'shipped'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(self.customer)
+        response = self.client.post(
+            self.url, {'status': 'shipped', 'ids': [str(uuid.uuid4())]},
+            format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class OrderTransitionTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='test123!',
+            role='admin')
+        cls.customer = User.objects.create_user(
+            username='customer', email='customer@example.com',
+            password='test123!')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.order = Order.objects.create(
+            user=self.customer, total_amount='10.00', shipping_address={})
+
+    def test_transition_applies_only_from_allowed_statuses(self):
+        self.assertTrue(transition_order(self.order.pk, 'processing'))
+        self.assertFalse(transition_order(self.order.pk, 'delivered'))
+        self.assertTrue(transition_order(self.order.pk, 'shipped'))
+        self.assertFalse(transition_order(self.order.pk, 'cancelled'))
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'shipped')
+
+    def test_transition_sends_signal_on_commit(self):
+        received = []
+
+        def receiver(sender, order_ids, status, **kwargs):
+            received.append((order_ids, status))
+
+        order_status_changed.connect(receiver)
+        self.addCleanup(order_status_changed.disconnect, receiver)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transition_order(self.order.pk, 'cancelled')
+            transition_order(self.order.pk, 'processing')
+            self.assertEqual(received, [])
+
+        self.assertEqual(received, [([self.order.pk], 'cancelled')])
+
+    def test_cancel_loses_to_a_concurrent_shipment(self):
+        self.client.force_authenticate(self.customer)
+        url = reverse('orders:cancel-order', kwargs={'order_id': self.order.pk})
+
+        # Shipped by another request after the cancel read the order
+        original = transition_order
+
+        def ship_first(order_id, new_status):
+            original(order_id, 'shipped')
+            return original(order_id, new_status)
+
+        with mock.patch('orders.views.transition_order', ship_first):
+            response = self.client.patch(url)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'shipped')
+
+    def test_every_cancel_path_puts_stock_back(self):
+        product = Product.objects.create(
+            name='Stocked', description='Test product', price='10.00',
+            brand='Acme', stock_quantity=5)
+        orders = Order.objects.bulk_create([
+            Order(user=self.customer, total_amount='20.00', shipping_address={},
+                  stock_reserved=True)
+            for _ in range(3)
+        ])
+        for order in orders:
+            order.items.create(product=product, quantity=2, price='10.00')
+
+        self.client.force_authenticate(self.customer)
+        self.client.patch(
+            reverse('orders:cancel-order', kwargs={'order_id': orders[0].pk}))
+        self.client.force_authenticate(self.admin)
+        self.client.patch(
+            reverse('orders:update-order-status',
+                    kwargs={'order_id': orders[1].pk}),
+            {'status': 'cancelled'}, format='json')
+        self.client.post(
+            reverse('orders:bulk-update-order-status'),
+            {'status': 'cancelled', 'ids': [str(order.pk) for order in orders]},
+            format='json')
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 11)
+
+    def test_cancelling_an_unreserved_order_leaves_stock(self):
+        # Placed before checkout reserved stock, so no units were taken
+        product = Product.objects.create(
+            name='Stocked', description='Test product', price='10.00',
+            brand='Acme', stock_quantity=5)
+        self.order.items.create(product=product, quantity=2, price='10.00')
+
+        self.client.force_authenticate(self.customer)
+        response = self.client.patch(
+            reverse('orders:cancel-order', kwargs={'order_id': self.order.pk}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 5)
+
+    def test_cancel_view(self):
+        self.client.force_authenticate(self.customer)
+        url = reverse('orders:cancel-order', kwargs={'order_id': self.order.pk})
+
+        response = self.client.patch(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['order']['status'], 'cancelled')
+
+        response = self.client.patch(url)
+        self.assertEqual(response.data['message'],
+                         'This order is already cancelled.')
+
+    def test_update_status_view_rejects_invalid_transition(self):
+        self.client.force_authenticate(self.admin)
+        url = reverse('orders:update-order-status',
+                      kwargs={'order_id': self.order.pk})
+
+        response = self.client.patch(url, {'status': 'delivered'},
+                                     format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.patch(url, {'status': 'shipped'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['order']['status'], 'shipped')
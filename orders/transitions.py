@@ -0,0 +1,96 @@
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import Order
+from .signals import order_status_changed
+from .stock import release_stock
+
+
+# Statuses an order may move to from each status
+TRANSITIONS = {
+    'pending': ('processing', 'shipped', 'cancelled'),
+    'processing': ('shipped', 'cancelled'),
+    'shipped': ('delivered',),
+    'delivered': (),
+    'cancelled': (),
+}
+
+# Backends with UPDATE ... RETURNING
+RETURNING_VENDORS = ('postgresql', 'sqlite')
+
+
+def can_transition(old_status, new_status):
+    return new_status in TRANSITIONS.get(old_status, ())
+
+
+def allowed_sources(new_status):
+    """Return the statuses an order may move to `new_status` from"""
+    return [old_status for old_status, targets in TRANSITIONS.items()
+            if new_status in targets]
+
+
+def transition(order_ids, new_status):
+    """
+    Move orders to `new_status` wherever their current status allows it.
+
+    The status check is part of the write, one UPDATE ... WHERE status IN
+    (allowed sources), so a concurrent transition of the same order makes
+    this one miss instead of being overwritten. Cancelled orders have their
+    items put back in stock in the same transaction. Returns the ids of the
+    orders that moved and sends `order_status_changed` for them on commit.
+    """
+    sources = allowed_sources(new_status)
+    if not order_ids or not sources:
+        return []
+
+    # No savepoint: a failure here should fail the caller's transaction
+    with transaction.atomic(savepoint=False):
+        if connection.vendor in RETURNING_VENDORS:
+            moved = _update_returning(order_ids, sources, new_status)
+        else:
+            moved = list(Order.objects.select_for_update().filter(
+                id__in=order_ids, status__in=sources
+            ).values_list('id', flat=True))
+            Order.objects.filter(id__in=moved).update(
+                status=new_status, updated_at=timezone.now())
+
+        if moved and new_status == 'cancelled':
+            release_stock(moved)
+
+    if moved:
+        transaction.on_commit(lambda: order_status_changed.send(
+            sender=Order, order_ids=moved, status=new_status))
+    return moved
+
+
+def transition_order(order_id, new_status):
+    """Move one order to `new_status`, returning whether it applied"""
+    return bool(transition([order_id], new_status))
+
+
+def _update_returning(order_ids, sources, new_status):
+    opts = Order._meta
+    qn = connection.ops.quote_name
+    columns = {
+        name: qn(opts.get_field(name).column)
+        for name in ('id', 'status', 'updated_at')
+    }
+    ids_sql = ', '.join(['%s'] * len(order_ids))
+    sources_sql = ', '.join(['%s'] * len(sources))
+    sql = (
+        f"UPDATE {qn(opts.db_table)} "
+        f"SET {columns['status']} = %s, {columns['updated_at']} = %s "
+        f"WHERE {columns['id']} IN ({ids_sql}) "
+        f"AND {columns['status']} IN ({sources_sql}) "
+        f"RETURNING {columns['id']}"
+    )
+    params = [
+        new_status,
+        opts.get_field('updated_at').get_db_prep_value(
+            timezone.now(), connection),
+        *[opts.pk.get_db_prep_value(order_id, connection)
+          for order_id in order_ids],
+        *sources,
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [opts.pk.to_python(row[0]) for row in cursor.fetchall()]
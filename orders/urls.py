@@ -3,6 +3,7 @@ from .views import (
     ListOrdersView,
     CreateOrderView,
     UpdateOrderStatusView,
+    BulkUpdateOrderStatusView,
     TrackOrderView,
     OrderDetailsView,
     CancelOrderView,
@@ -13,6 +14,8 @@ urlpatterns = [
     path('orders/create/', CreateOrderView.as_view(), name='create-order'),
     path('orders/<uuid:order_id>/status/',
          UpdateOrderStatusView.as_view(), name='update-order-status'),
+    path('orders/status/', BulkUpdateOrderStatusView.as_view(),
+         name='bulk-update-order-status'),
     path('orders/<uuid:order_id>/track/',
          TrackOrderView.as_view(), name='track-order'),
     path('orders/<uuid:order_id>/',
@@ -4,9 +4,16 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from django.db import transaction
-from cart.models import CartItem
+from django.db.models import prefetch_related_objects
+from cart.models import Cart, CartItem
+from cart.stores import get_cart_store
+from cart.totals import unit_price
+from core.idempotency import idempotent
+from products.models import ProductImage
 from .models import Order, OrderItem
-from .serializers import OrderSerializer
+from .serializers import BulkOrderStatusSerializer, OrderSerializer
+from .stock import InsufficientStock, reserve_stock
+from .transitions import can_transition, transition, transition_order
 from rest_framework.pagination import PageNumberPagination
 
 
@@ -14,10 +21,18 @@ class ListOrdersView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        if request.user.role == 'admin':
-            orders = Order.objects.all()
-        else:
-            orders = Order.objects.filter(user=request.user)
+        orders = Order.objects.with_items().order_by('-created_at')
+        if request.user.role != 'admin':
+            orders = orders.filter(user=request.user)
+
+        order_status = request.query_params.get('status')
+        if order_status:
+            if order_status not in dict(Order.STATUS_CHOICES):
+                return Response({
+                    "success": False,
+                    "message": "Invalid status provided."
+                }, status=status.HTTP_400_BAD_REQUEST)
+            orders = orders.filter(status=order_status)
 
         # Pagination
         paginator = PageNumberPagination()
@@ -32,6 +47,7 @@ class ListOrdersView(APIView):
 class CreateOrderView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def post(self, request):
         user = request.user
         serializer = OrderSerializer(
@@ -46,38 +62,71 @@ class CreateOrderView(APIView):
 
         try:
             with transaction.atomic():
-                cart_items = CartItem.objects.filter(cart__user=user)
-
-                if not cart_items.exists():
+                store = get_cart_store()
+                cart = Cart.objects.filter(user=user).first()
+                if cart is not None:
+                    # Write carts held outside the database through to rows
+                    store.flush(cart)
+
+                # One locked read of every line, so no add can slip in
+                # between the order insert and the cart delete
+                cart_items = list(
+                    CartItem.objects.select_for_update().filter(cart=cart))
+
+                if not cart_items:
                     return Response({
                         "success": False,
                         "message": "Your cart is empty. Add items to proceed."
                     }, status=status.HTTP_400_BAD_REQUEST)
 
-                total_amount = sum(item.product.price *
-                                   item.quantity for item in cart_items)
+                products = reserve_stock(cart_items)
+                # Priced from the locked rows, like the lines below; the
+                # cached cart totals are for display only
                 order = Order.objects.create(
                     user=user,
-                    total_amount=total_amount,
-                    shipping_address=request.data.get('shipping_address', {})
+                    total_amount=sum(
+                        unit_price(products[item.product_id]) * item.quantity
+                        for item in cart_items),
+                    shipping_address=request.data.get('shipping_address', {}),
+                    stock_reserved=True
                 )
 
-                order_items = [
-                    OrderItem(
+                main_images = {
+                    image.product_id: image
+                    for image in ProductImage.objects.filter(
+                        product_id__in=products, is_main=True)
+                }
+
+                order_items = []
+                for item in cart_items:
+                    product = products[item.product_id]
+                    main_image = main_images.get(product.pk)
+                    order_items.append(OrderItem(
                         order=order,
-                        product=item.product,
+                        product=product,
                         quantity=item.quantity,
-                        price=item.product.price
-                    ) for item in cart_items
-                ]
+                        price=unit_price(product),
+                        product_name=product.name,
+                        product_price=product.price,
+                        product_image=(main_image.image.url
+                                       if main_image and main_image.image
+                                       else '')
+                    ))
                 OrderItem.objects.bulk_create(order_items)
-                cart_items.delete()
+                store.clear(cart)
 
-                return Response({
-                    "success": True,
-                    "message": "Order created successfully.",
-                    "order": OrderSerializer(order).data
-                }, status=status.HTTP_201_CREATED)
+            prefetch_related_objects([order], 'items')
+            return Response({
+                "success": True,
+                "message": "Order created successfully.",
+                "order": OrderSerializer(order).data
+            }, status=status.HTTP_201_CREATED)
+        except InsufficientStock as e:
+            return Response({
+                "success": False,
+                "message": "Some items do not have enough stock.",
+                "errors": {"out_of_stock": e.shortages}
+            }, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({
                 "success": False,
@@ -96,7 +145,6 @@ class UpdateOrderStatusView(APIView):
                 "message": "You do not have permission to perform this action."
             }, status=status.HTTP_403_FORBIDDEN)
 
-        order = get_object_or_404(Order, id=order_id)
         new_status = request.data.get('status')
 
         if not new_status or new_status not in dict(Order.STATUS_CHOICES):
@@ -105,8 +153,14 @@ class UpdateOrderStatusView(APIView):
                 "message": "Invalid status provided."
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        order.status = new_status
-        order.save()
+        moved = transition_order(order_id, new_status)
+        order = get_object_or_404(Order.objects.with_items(), id=order_id)
+        if not moved:
+            return Response({
+                "success": False,
+                "message": f"Cannot change status from {order.status} to {new_status}."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
         return Response({
             "success": True,
             "message": "Order status updated successfully.",
@@ -114,13 +168,92 @@ class UpdateOrderStatusView(APIView):
         }, status=status.HTTP_200_OK)
 
 
+class BulkUpdateOrderStatusView(APIView):
+    """
+    Move many orders to one status with a single UPDATE.
+
+    Orders are picked by id or by a filter, locked and read once to check
+    each transition, and the allowed ones are moved by one conditional
+    UPDATE ... WHERE id IN. The response reports each order's outcome
+    rather than serializing the orders.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if request.user.role != 'admin':
+            return Response({
+                "success": False,
+                "message": "You do not have permission to perform this action."
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        serializer = BulkOrderStatusSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"success": False, "errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        new_status = data['status']
+        limit = BulkOrderStatusSerializer.MAX_ORDERS
+        orders = Order.objects.all()
+        if 'ids' in data:
+            order_ids = list(dict.fromkeys(data['ids']))
+            orders = orders.filter(id__in=order_ids)
+        else:
+            filters = data['filter']
+            if 'status' in filters:
+                orders = orders.filter(status=filters['status'])
+            if 'created_after' in filters:
+                orders = orders.filter(created_at__gte=filters['created_after'])
+            if 'created_before' in filters:
+                orders = orders.filter(created_at__lt=filters['created_before'])
+
+        with transaction.atomic():
+            # Locked in id order so overlapping bulk updates cannot deadlock
+            current = dict(orders.select_for_update().order_by('id')
+                           .values_list('id', 'status')[:limit + 1])
+            if len(current) > limit:
+                return Response({
+                    "success": False,
+                    "message": f"The filter matches more than {limit} orders."
+                }, status=status.HTTP_400_BAD_REQUEST)
+            if 'filter' in data:
+                order_ids = list(current)
+
+            moved = set(transition(
+                [order_id for order_id, order_status in current.items()
+                 if can_transition(order_status, new_status)],
+                new_status))
+
+        results = []
+        for order_id in order_ids:
+            old_status = current.get(order_id)
+            if old_status is None:
+                results.append({"id": order_id, "updated": False,
+                                "error": "Order not found."})
+            elif order_id in moved:
+                results.append({"id": order_id, "updated": True,
+                                "previous_status": old_status,
+                                "status": new_status})
+            else:
+                results.append({
+                    "id": order_id, "updated": False, "status": old_status,
+                    "error": f"Cannot change status from {old_status} to {new_status}."
+                })
+
+        return Response({
+            "success": True,
+            "message": f"{len(moved)} of {len(order_ids)} orders updated.",
+            "updated": len(moved),
+            "results": results
+        }, status=status.HTTP_200_OK)
+
+
 class TrackOrderView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, order_id):
-        order = get_object_or_404(Order, id=order_id)
+        order = get_object_or_404(Order.objects.with_items(), id=order_id)
 
-        if request.user.role != 'admin' and order.user != request.user:
+        if request.user.role != 'admin' and order.user_id != request.user.pk:
             return Response({
                 "success": False,
                 "message": "You do not have permission to view this order."
@@ -137,9 +270,9 @@ class OrderDetailsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, order_id):
-        order = get_object_or_404(Order, id=order_id)
+        order = get_object_or_404(Order.objects.with_items(), id=order_id)
 
-        if request.user.role != 'admin' and order.user != request.user:
+        if request.user.role != 'admin' and order.user_id != request.user.pk:
             return Response({
                 "success": False,
                 "message": "You do not have permission to view this order."
@@ -156,28 +289,30 @@ class CancelOrderView(APIView):
     permission_classes = [IsAuthenticated]
 
     def patch(self, request, order_id):
-        order = get_object_or_404(Order, id=order_id)
+        order = get_object_or_404(Order.objects.with_items(), id=order_id)
 
-        if request.user.role != 'admin' and order.user != request.user:
+        if request.user.role != 'admin' and order.user_id != request.user.pk:
             return Response({
                 "success": False,
                 "message": "You do not have permission to cancel this order."
             }, status=status.HTTP_403_FORBIDDEN)
 
-        if order.status == 'cancelled':
+        moved = transition_order(order.pk, 'cancelled')
+        # Reread, since a concurrent change may have won the race
+        order.refresh_from_db(fields=['status', 'updated_at'])
+
+        if not moved and order.status == 'cancelled':
             return Response({
                 "success": False,
                 "message": "This order is already cancelled."
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        if order.status in ['shipped', 'delivered']:
+        if not moved:
             return Response({
                 "success": False,
                 "message": "Cannot cancel an order that has already been shipped or delivered."
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        order.status = 'cancelled'
-        order.save()
         return Response({
             "success": True,
             "message": "Order cancelled successfully.",
@@ -1,8 +1,13 @@
+from types import SimpleNamespace
+from unittest import mock
+import stripe
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from orders.models import Order
+from users.models import User
 from .models import Payment
 
 
@@ -67,3 +72,54 @@ class PaymentAPITestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['payment_id'], payment.id)
         self.assertEqual(response.data['status'], 'pending')
+
+
+class PaymentIdempotencyTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(
+            username='payer', email='payer@example.com', password='test123!')
+        self.order = Order.objects.create(
+            user=user, total_amount='100.00', shipping_address={})
+        self.client = APIClient()
+        self.url = reverse('payments:create-payment')
+        self.data = {'order_id': str(self.order.id),
+                     'payment_method_id': 'pm_card_visa'}
+
+    def test_transient_stripe_error_can_be_retried_with_the_same_key(self):
+        succeeded = SimpleNamespace(id='pi_1', status='succeeded')
+        with mock.patch('stripe.PaymentIntent.create', side_effect=[
+                stripe.error.APIConnectionError('Network error'), succeeded]):
+            first = self.client.post(self.url, self.data, format='json',
+                                     HTTP_IDEMPOTENCY_KEY='pay-1')
+            second = self.client.post(self.url, self.data, format='json',
+                                      HTTP_IDEMPOTENCY_KEY='pay-1')
+
+        self.assertEqual(first.status_code,
+                         status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Idempotent-Replayed', second)
+        self.assertEqual(Payment.objects.get().status, 'completed')
+
+    def test_card_error_is_replayed(self):
+        declined = stripe.error.CardError('Card declined', None, 'card_declined')
+        with mock.patch('stripe.PaymentIntent.create',
+                        side_effect=declined) as create:
+            first = self.client.post(self.url, self.data, format='json',
+                                     HTTP_IDEMPOTENCY_KEY='pay-1')
+            second = self.client.post(self.url, self.data, format='json',
+                                      HTTP_IDEMPOTENCY_KEY='pay-1')
+
+        self.assertEqual(first.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(create.call_count, 1)
+
+    def test_stripe_key_fits_stripes_limit(self):
+        succeeded = SimpleNamespace(id='pi_1', status='succeeded')
+        with mock.patch('stripe.PaymentIntent.create',
+                        return_value=succeeded) as create:
+            self.client.post(self.url, self.data, format='json',
+                             HTTP_IDEMPOTENCY_KEY='k' * 255)
+
+        self.assertLessEqual(
+            len(create.call_args.kwargs['idempotency_key']), 255)
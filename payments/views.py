@@ -1,19 +1,30 @@
+import hashlib
 from django.conf import settings
 import stripe
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
+from core.idempotency import idempotent
 from .serializers import PaymentMethodSerializer, PaymentSerializer
 from .models import Payment
 from orders.models import Order
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
+# Stripe failures that may succeed on retry. Answered with 503 so clients
+# retry and the idempotency layer does not keep them for the key.
+TRANSIENT_STRIPE_ERRORS = (
+    stripe.error.APIConnectionError,
+    stripe.error.RateLimitError,
+    stripe.error.APIError,
+)
+
 
 class PaymentAPI(APIView):
     serializer_class = PaymentMethodSerializer
 
+    @idempotent
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
 
@@ -35,6 +46,18 @@ class PaymentAPI(APIView):
                 }
             )
 
+            # Forward the client's key so Stripe also dedupes a retry that
+            # reaches it before our response was stored. Stripe keys are
+            # account wide, so scope it to the payment and the call, and
+            # hash the client's key to stay within Stripe's 255 characters.
+            client_key = request.headers.get('Idempotency-Key')
+
+            def stripe_idempotency_key(action):
+                if not client_key:
+                    return None
+                digest = hashlib.sha256(client_key.encode()).hexdigest()
+                return f"payment-{payment.id}-{action}-{digest}"
+
             # Create or update Payment Intent
             if not payment.stripe_payment_intent_id:
                 payment_intent = stripe.PaymentIntent.create(
@@ -46,14 +69,16 @@ class PaymentAPI(APIView):
                     metadata={
                         'order_id': str(order.id),
                         'payment_id': payment.id
-                    }
+                    },
+                    idempotency_key=stripe_idempotency_key('create')
                 )
                 payment.stripe_payment_intent_id = payment_intent.id
                 payment.save()
             else:
                 payment_intent = stripe.PaymentIntent.modify(
                     payment.stripe_payment_intent_id,
-                    payment_method=payment_method_id
+                    payment_method=payment_method_id,
+                    idempotency_key=stripe_idempotency_key('modify')
                 )
 
             # Handle payment confirmation
@@ -77,6 +102,8 @@ class PaymentAPI(APIView):
 
         except Order.DoesNotExist:
             return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
+        except TRANSIENT_STRIPE_ERRORS as e:
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         except stripe.error.StripeError as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
@@ -0,0 +1,24 @@
+from django.db import transaction
+from core.cache import bump_cache_generation, get_cache_generation
+
+
+def _product_namespace(product_id):
+    return f"product:{product_id}"
+
+
+def get_product_version(product_id):
+    """Return the current version of a product's cached detail"""
+    return get_cache_generation(_product_namespace(product_id))
+
+
+def bump_product_versions(product_ids):
+    """Retire the cached details of products once the current write commits.
+
+    For frequent writes to a few products, such as stock changes at checkout,
+    that should not retire the whole catalog.
+    """
+    product_ids = list(product_ids)
+    transaction.on_commit(lambda: [
+        bump_cache_generation(_product_namespace(product_id))
+        for product_id in product_ids
+    ])
@@ -0,0 +1,111 @@
+from django.db.models import Case, CharField, Count, IntegerField, Value, When
+
+
+FACETS = ('category', 'brand', 'price', 'rating')
+
+PRICE_BUCKETS = [
+    ('0-25', 0, 25),
+    ('25-50', 25, 50),
+    ('50-100', 50, 100),
+    ('100-250', 100, 250),
+    ('250+', 250, None),
+]
+
+RATING_BUCKETS = [5, 4, 3, 2, 1, 0]
+
+# Columns each facet groups by in the aggregate query
+FACET_COLUMNS = {
+    'category': ('category_id', 'category__name'),
+    'brand': ('brand',),
+    'price': ('price_bucket',),
+    'rating': ('rating_bucket',),
+}
+
+
+def parse_facets(value):
+    """Split a `facets` query parameter into facet names"""
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    if 'all' in names:
+        return list(FACETS)
+    invalid = [name for name in names if name not in FACETS]
+    if invalid:
+        raise ValueError(f"Unknown facets: {', '.join(invalid)}.")
+    return [name for name in FACETS if name in names]
+
+
+def price_bucket():
+    whens = []
+    for label, low, high in PRICE_BUCKETS:
+        if high is None:
+            whens.append(When(price__gte=low, then=Value(label)))
+        else:
+            whens.append(When(price__gte=low, price__lt=high,
+                              then=Value(label)))
+    return Case(*whens, output_field=CharField())
+
+
+def rating_bucket():
+    return Case(
+        *[When(rating__gte=rating, then=Value(rating))
+          for rating in RATING_BUCKETS],
+        output_field=IntegerField()
+    )
+
+
+def compute_facets(queryset, facets=FACETS):
+    """
+    Count products per facet value in a single aggregate query.
+
+    The filtered queryset is grouped by every requested facet column at once
+    and the grouped counts are rolled up per facet in Python, so the number
+    of rows read is bounded by the distinct facet combinations rather than
+    the number of products.
+    """
+    columns = [column for facet in facets for column in FACET_COLUMNS[facet]]
+    rows = queryset.order_by().annotate(
+        price_bucket=price_bucket(),
+        rating_bucket=rating_bucket()
+    ).values(*columns).annotate(count=Count('pk'))
+
+    categories, brands = {}, {}
+    prices = dict.fromkeys([label for label, _, _ in PRICE_BUCKETS], 0)
+    ratings = dict.fromkeys(RATING_BUCKETS, 0)
+
+    for row in rows:
+        count = row['count']
+        if 'category' in facets and row['category_id'] is not None:
+            category = categories.setdefault(row['category_id'], {
+                'id': row['category_id'],
+                'name': row['category__name'],
+                'count': 0
+            })
+            category['count'] += count
+        if 'brand' in facets and row['brand']:
+            brands[row['brand']] = brands.get(row['brand'], 0) + count
+        if 'price' in facets and row['price_bucket'] is not None:
+            prices[row['price_bucket']] += count
+        if 'rating' in facets and row['rating_bucket'] is not None:
+            ratings[row['rating_bucket']] += count
+
+    result = {}
+    if 'category' in facets:
+        result['category'] = sorted(
+            categories.values(), key=lambda c: (-c['count'], c['name']))
+    if 'brand' in facets:
+        result['brand'] = [
+            {'value': brand, 'count': count}
+            for brand, count in sorted(
+                brands.items(), key=lambda b: (-b[1], b[0]))
+        ]
+    if 'price' in facets:
+        result['price'] = [
+            {'range': label, 'min': low, 'max': high,
+             'count': prices[label]}
+            for label, low, high in PRICE_BUCKETS
+        ]
+    if 'rating' in facets:
+        result['rating'] = [
+            {'rating': rating, 'count': ratings[rating]}
+            for rating in RATING_BUCKETS
+        ]
+    return result
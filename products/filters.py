@@ -1,7 +1,7 @@
 import django_filters
-from django.db.models import Q
 from django.core.exceptions import ValidationError
 from .models import Product, Category
+from .search import get_search_backend
 
 
 class ProductFilter(django_filters.FilterSet):
@@ -47,11 +47,7 @@ class ProductFilter(django_filters.FilterSet):
         fields = []
 
     def custom_search(self, queryset, name, value):
-        return queryset.filter(
-            Q(name__icontains=value) |
-            Q(brand__icontains=value) |
-            Q(category__name__icontains=value)
-        ).distinct()
+        return get_search_backend().search(queryset, value)
 
     def filter_rating(self, queryset, name, value):
         try:
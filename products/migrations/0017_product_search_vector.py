@@ -0,0 +1,56 @@
+# Generated by Django 4.2.19 on 2026-10-18 09:40
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# The GIN index and the initial vectors only exist on Postgres; other
+# databases use the in-process index from products.search instead.
+CREATE_SEARCH_INDEX = """
+    CREATE INDEX IF NOT EXISTS products_product_search_vector_gin
+    ON products_product USING gin (search_vector)
+"""
+
+DROP_SEARCH_INDEX = """
+    DROP INDEX IF EXISTS products_product_search_vector_gin
+"""
+
+POPULATE_SEARCH_VECTOR = """
+    UPDATE products_product AS p SET search_vector =
+        setweight(to_tsvector('english', coalesce(p.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(p.brand, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce((
+            SELECT c.name FROM categories_category AS c
+            WHERE c.id = p.category_id
+        ), '')), 'C')
+"""
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREATE_SEARCH_INDEX)
+    schema_editor.execute(POPULATE_SEARCH_VECTOR)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(DROP_SEARCH_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0002_remove_category_categories__parent__6ada01_idx_and_more'),
+        ('products', '0016_alter_productimage_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
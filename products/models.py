@@ -1,7 +1,9 @@
 import uuid
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from cloudinary.models import CloudinaryField
 from categories.models import Category
+from core.cache import CATALOG, invalidate_cache_tags
 
 
 class Product(models.Model):
@@ -27,6 +29,7 @@ class Product(models.Model):
     features = models.JSONField(default=list)
     specifications = models.JSONField(default=dict)
     tags = models.JSONField(default=list)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -41,6 +44,9 @@ class Product(models.Model):
         self.rating = self.total_rating_sum / \
             self.total_reviews if self.total_reviews > 0 else 0.0
         self.save()
+        # Review signals bump before this save; bump again so no payload
+        # read in between is cached with the old rating
+        invalidate_cache_tags(CATALOG)
 
     class Meta:
         verbose_name = "Product"
@@ -70,3 +76,10 @@ class ProductImage(models.Model):
                 name='unique_main_image_per_product'
             )
         ]
+
+
+def main_images_prefetch(lookup='product_images'):
+    """Prefetch only each product's main image, into `main_images`"""
+    return models.Prefetch(
+        lookup, queryset=ProductImage.objects.filter(is_main=True),
+        to_attr='main_images')
@@ -0,0 +1,224 @@
+import re
+import threading
+from bisect import bisect_left, insort
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Case, F, FloatField, OuterRef, Subquery, Value, When
+from django.utils.module_loading import import_string
+from categories.models import Category
+
+
+SEARCH_CONFIG = 'english'
+
+
+class BaseSearchBackend:
+    """Interface for the engine behind `ProductFilter.custom_search`"""
+
+    @staticmethod
+    def tokenize(text):
+        return re.findall(r'\w+', (text or '').lower())
+
+    def search(self, queryset, value):
+        """Filter `queryset` to products matching `value`, best match first"""
+        raise NotImplementedError
+
+    def index_product(self, product):
+        """Add or refresh a single product in the index"""
+
+    def remove_product(self, pk):
+        """Drop a deleted product from the index"""
+
+    def index_category(self, category):
+        """Refresh every product that belongs to a renamed category"""
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Full-text search over the GIN-indexed `Product.search_vector` column.
+
+    The vector is weighted name (A), brand (B) and category name (C) and is
+    kept up to date with single UPDATE statements from the product signals.
+    Every query term is matched as a prefix of a stemmed lexeme and all
+    terms must match, the same semantics as the in-process index.
+    """
+
+    @staticmethod
+    def vector():
+        category_name = Subquery(
+            Category.objects.filter(
+                pk=OuterRef('category_id')).values('name')[:1]
+        )
+        return (
+            SearchVector('name', weight='A', config=SEARCH_CONFIG) +
+            SearchVector('brand', weight='B', config=SEARCH_CONFIG) +
+            SearchVector(category_name, weight='C', config=SEARCH_CONFIG)
+        )
+
+    def search(self, queryset, value):
+        # Tokens are word characters only, so none of them carry tsquery
+        # operators into the raw query
+        tokens = self.tokenize(value)
+        if not tokens:
+            return queryset.none()
+
+        query = SearchQuery(' & '.join(f'{token}:*' for token in tokens),
+                            search_type='raw', config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        ).order_by('-search_rank', '-created_at')
+
+    def index_product(self, product):
+        from .models import Product
+        Product.objects.filter(pk=product.pk).update(
+            search_vector=self.vector())
+
+    def index_category(self, category):
+        from .models import Product
+        Product.objects.filter(category_id=category.pk).update(
+            search_vector=self.vector())
+
+
+class InvertedIndexSearchBackend(BaseSearchBackend):
+    """
+    In-process inverted index used on SQLite and in tests.
+
+    The index is built from the database on first use and then maintained
+    incrementally from the product signals. Query terms match indexed terms
+    by prefix, every term must match, and products are ranked by the summed
+    weight of the fields the terms were found in.
+
+    The index is per process: other gunicorn workers never see a save made
+    in this one, so it must not be used as a production backend.
+    """
+    field_weights = {'name': 3.0, 'brand': 2.0, 'category': 1.0}
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._documents = {}
+        self._terms = []
+        self._loaded = False
+
+    def search(self, queryset, value):
+        tokens = self.tokenize(value)
+        if not tokens:
+            return queryset.none()
+
+        with self._lock:
+            self._ensure_loaded()
+            scores = None
+            for token in tokens:
+                token_scores = self._match(token)
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {
+                        pk: score + token_scores[pk]
+                        for pk, score in scores.items() if pk in token_scores
+                    }
+                if not scores:
+                    return queryset.none()
+
+        return queryset.filter(pk__in=scores.keys()).annotate(
+            search_rank=Case(
+                *[When(pk=pk, then=Value(score))
+                  for pk, score in scores.items()],
+                default=Value(0.0),
+                output_field=FloatField()
+            )
+        ).order_by('-search_rank', '-created_at')
+
+    def index_product(self, product):
+        with self._lock:
+            if not self._loaded:
+                return
+            category = product.category.name if product.category_id else ''
+            self._add(product.pk, product.name, product.brand, category)
+
+    def remove_product(self, pk):
+        with self._lock:
+            self._discard(pk)
+
+    def index_category(self, category):
+        from .models import Product
+        with self._lock:
+            if not self._loaded:
+                return
+            rows = Product.objects.filter(category_id=category.pk).values_list(
+                'pk', 'name', 'brand')
+            for pk, name, brand in rows:
+                self._add(pk, name, brand, category.name)
+
+    def _ensure_loaded(self):
+        from .models import Product
+        if self._loaded:
+            return
+        rows = Product.objects.values_list(
+            'pk', 'name', 'brand', 'category__name')
+        for pk, name, brand, category in rows:
+            self._add(pk, name, brand, category)
+        self._loaded = True
+
+    def _match(self, token):
+        matches = {}
+        position = bisect_left(self._terms, token)
+        while position < len(self._terms):
+            term = self._terms[position]
+            if not term.startswith(token):
+                break
+            for pk, weight in self._postings[term].items():
+                matches[pk] = max(matches.get(pk, 0.0), weight)
+            position += 1
+        return matches
+
+    def _add(self, pk, name, brand, category):
+        self._discard(pk)
+        weights = {}
+        for field, text in (('name', name), ('brand', brand),
+                            ('category', category)):
+            for token in self.tokenize(text):
+                weights[token] = max(
+                    weights.get(token, 0.0), self.field_weights[field])
+
+        for token, weight in weights.items():
+            if token not in self._postings:
+                self._postings[token] = {}
+                insort(self._terms, token)
+            self._postings[token][pk] = weight
+        self._documents[pk] = set(weights)
+
+    def _discard(self, pk):
+        for token in self._documents.pop(pk, ()):
+            postings = self._postings[token]
+            postings.pop(pk, None)
+            if not postings:
+                del self._postings[token]
+                del self._terms[bisect_left(self._terms, token)]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    """
+    Return the configured product search backend.
+
+    `PRODUCT_SEARCH_BACKEND` may name a backend class by dotted path;
+    otherwise Postgres databases use full-text search and everything else
+    falls back to the in-process index.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+                if path:
+                    backend_class = import_string(path)
+                elif connection.vendor == 'postgresql':
+                    backend_class = PostgresSearchBackend
+                else:
+                    backend_class = InvertedIndexSearchBackend
+                _backend = backend_class()
+    return _backend
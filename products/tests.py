@@ -1,3 +1,332 @@
+from types import SimpleNamespace
+from django.core.cache import cache
+from unittest import mock, skipUnless
+from django.db import connection
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework import status
+from categories.models import Category
+from core.utils import ProductCursorPagination
+from orders.stock import reserve_stock
+from .models import Product, ProductImage
+from .facets import compute_facets
+from .filters import ProductFilter
+from .search import PostgresSearchBackend, get_search_backend
 
-# Create your tests here.
+
+class ProductListQueryCountTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Electronics')
+        for i in range(100):
+            product = Product.objects.create(
+                name=f'Product {i}',
+                description='Test product',
+                price='10.00',
+                category=category,
+                brand='Acme'
+            )
+            ProductImage.objects.create(
+                product=product, image=f'products/{i}-main', is_main=True)
+            ProductImage.objects.create(
+                product=product, image=f'products/{i}-alt')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = reverse('products:product-list')
+
+    def assert_list_queries(self, page_size):
+        # COUNT(*), products joined to categories, and one image prefetch
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {'page_size': page_size})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), page_size)
+        for product in response.data['results']:
+            self.assertEqual(product['category'], 'Electronics')
+            self.assertEqual(len(product['images']), 2)
+
+    def test_list_queries_page_size_10(self):
+        self.assert_list_queries(10)
+
+    def test_list_queries_page_size_100(self):
+        self.assert_list_queries(100)
+
+    def test_cached_response_matches_uncached_response(self):
+        first = self.client.get(self.url, {'page_size': 10, 'page': 2})
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url, {'page_size': 10, 'page': 2})
+
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(second.data['count'], 100)
+        self.assertIsNotNone(second.data['next'])
+        self.assertIsNotNone(second.data['previous'])
+
+    def test_count_is_shared_across_pages(self):
+        self.client.get(self.url, {'page_size': 10})
+
+        # Products and images only; the COUNT(*) comes from the cache
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'page_size': 10, 'page': 3})
+
+        self.assertEqual(response.data['count'], 100)
+
+    def test_detail_queries(self):
+        product = Product.objects.first()
+        url = reverse('products:product-detail', kwargs={'pk': product.pk})
+
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['product']['images']), 2)
+
+
+class FacetTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        audio = Category.objects.create(name='Audio')
+        power = Category.objects.create(name='Power')
+        network = Category.objects.create(name='Network')
+        for name, category, brand, price, rating in [
+            ('Wireless Headphones', audio, 'Sonic', '20.00', 4.5),
+            ('Wireless Speaker', audio, 'Acme', '60.00', 3.2),
+            ('Wireless Charger', power, 'Acme', '30.00', 5.0),
+            # Filtered out by price and by search respectively
+            ('Wireless Router', network, 'Netco', '300.00', 4.0),
+            ('USB Cable', power, 'Acme', '10.00', 2.0),
+        ]:
+            Product.objects.create(
+                name=name, description='Test product', category=category,
+                brand=brand, price=price, rating=rating)
+
+    def test_counts_every_facet_in_one_query(self):
+        queryset = ProductFilter(
+            {'search': 'wireless', 'max_price': '100'},
+            queryset=Product.objects.all()).qs
+
+        with self.assertNumQueries(1):
+            facets = compute_facets(queryset)
+
+        self.assertEqual(
+            [(c['name'], c['count']) for c in facets['category']],
+            [('Audio', 2), ('Power', 1)])
+        self.assertEqual(facets['brand'], [
+            {'value': 'Acme', 'count': 2}, {'value': 'Sonic', 'count': 1}])
+        self.assertEqual(
+            {bucket['range']: bucket['count'] for bucket in facets['price']},
+            {'0-25': 1, '25-50': 1, '50-100': 1, '100-250': 0, '250+': 0})
+        self.assertEqual(
+            {bucket['rating']: bucket['count'] for bucket in facets['rating']},
+            {5: 1, 4: 1, 3: 1, 2: 0, 1: 0, 0: 0})
+
+    def test_returns_only_requested_facets(self):
+        facets = compute_facets(Product.objects.all(), ['brand'])
+
+        self.assertEqual(list(facets), ['brand'])
+        self.assertEqual(facets['brand'][0], {'value': 'Acme', 'count': 3})
+
+    def test_unknown_facet_is_rejected(self):
+        cache.clear()
+        response = APIClient().get(reverse('products:product-list'),
+                                   {'facets': 'brand,color'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors']['facets'],
+                         ['Unknown facets: color.'])
+
+
+class ProductCursorPaginationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Every sort column has ties, so pages split runs of equal values
+        for i, (price, rating) in enumerate(
+                [(5, 4.0), (5, 4.0), (5, 3.0), (10, 4.0), (10, 3.0),
+                 (20, 5.0), (20, 5.0)]):
+            Product.objects.create(
+                name=f'Product {i}', description='Test product',
+                price=price, rating=rating, brand='Acme')
+        created_at = Product.objects.first().created_at
+        Product.objects.update(created_at=created_at)
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+
+    def paginate(self, url):
+        paginator = ProductCursorPagination()
+        page = paginator.paginate_queryset(
+            Product.objects.all(), Request(self.factory.get(url)))
+        return (page, paginator.get_next_link(),
+                paginator.get_previous_link())
+
+    def test_traverses_every_ordering_both_ways(self):
+        for ordering, fields in ProductCursorPagination.orderings.items():
+            with self.subTest(ordering=ordering):
+                expected = list(Product.objects.order_by(*fields))
+
+                forward, url = [], f'/products/?ordering={ordering}&page_size=2'
+                while url:
+                    last_url = url
+                    page, url, _ = self.paginate(url)
+                    forward.extend(page)
+                self.assertEqual(forward, expected)
+
+                # Back from the last page through the previous links
+                backward, url = [], last_url
+                while url:
+                    page, _, url = self.paginate(url)
+                    backward[:0] = page
+                self.assertEqual(backward, expected)
+
+    def test_first_page_has_no_previous_link(self):
+        page, next_link, previous_link = self.paginate('/products/?page_size=3')
+
+        self.assertEqual(len(page), 3)
+        self.assertIsNotNone(next_link)
+        self.assertIsNone(previous_link)
+
+    def test_page_size_is_capped(self):
+        paginator = ProductCursorPagination()
+        for page_size, expected in (('500', 100), ('0', 10), ('x', 10)):
+            request = Request(self.factory.get(
+                '/products/', {'page_size': page_size}))
+            self.assertEqual(paginator.get_page_size(request), expected)
+
+    def test_invalid_cursors_are_not_found(self):
+        # Not base64, not JSON, and JSON missing the id
+        for cursor in ('not-base64!', 'bm90IGpzb24=',
+                       'eyJwIjogIjUuMDAifQ=='):
+            with self.subTest(cursor=cursor), self.assertRaises(NotFound):
+                self.paginate(f'/products/?ordering=price&cursor={cursor}')
+
+    def test_view_answers_invalid_cursor_with_not_found(self):
+        response = APIClient().get(reverse('products:product-list'), {
+            'pagination': 'cursor', 'cursor': 'not-base64!'})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(str(response.data['detail']), 'Invalid cursor')
+
+
+class ConditionalGetTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product = Product.objects.create(
+            name='Speaker', description='Test product', price='49.00',
+            brand='Acme', stock_quantity=5)
+        self.url = reverse('products:product-detail',
+                           kwargs={'pk': self.product.pk})
+
+    def test_matching_etag_returns_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_unmodified_since_returns_not_modified(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['Last-Modified'], last_modified)
+
+    def test_cache_hits_reuse_the_stored_etag(self):
+        etag = self.client.get(self.url)['ETag']
+
+        with mock.patch('core.cache.json.dumps') as dumps:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        dumps.assert_not_called()
+
+    def test_etag_depends_on_media_type(self):
+        json_etag = self.client.get(self.url)['ETag']
+        msgpack_etag = self.client.get(
+            self.url, HTTP_ACCEPT='application/msgpack')['ETag']
+
+        self.assertNotEqual(json_etag, msgpack_etag)
+
+    def test_stock_change_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+
+        # Checkout changes stock without bumping the catalog generation
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_stock([SimpleNamespace(product_id=self.product.pk,
+                                           quantity=2)])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['product']['stock_quantity'], 3)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class InvertedIndexSearchTestCase(TestCase):
+    def setUp(self):
+        self.backend = get_search_backend()
+        self.category = Category.objects.create(name='Audio')
+        self.headphones = Product.objects.create(
+            name='Wireless Headphones', description='Test product',
+            price='99.00', category=self.category, brand='Sonic')
+        self.speaker = Product.objects.create(
+            name='Bluetooth Speaker', description='Test product',
+            price='49.00', category=self.category, brand='Wireless Co')
+
+    def search(self, value):
+        return list(self.backend.search(Product.objects.all(), value))
+
+    def test_ranks_name_matches_above_brand_matches(self):
+        self.assertEqual(self.search('wireless'),
+                         [self.headphones, self.speaker])
+
+    def test_matches_prefixes_and_requires_every_term(self):
+        self.assertEqual(self.search('head son'), [self.headphones])
+        self.assertEqual(self.search('headphones speaker'), [])
+
+    def test_index_is_maintained_on_save_and_delete(self):
+        self.search('audio')
+        self.speaker.name = 'Portable Speaker'
+        self.speaker.save()
+        self.assertEqual(self.search('portable'), [self.speaker])
+
+        self.headphones.delete()
+        self.assertEqual(self.search('audio'), [self.speaker])
+
+
+@skipUnless(connection.vendor == 'postgresql', "Needs Postgres full-text search")
+class PostgresSearchTestCase(TestCase):
+    def setUp(self):
+        self.backend = PostgresSearchBackend()
+        category = Category.objects.create(name='Audio')
+        self.headphones = Product.objects.create(
+            name='Wireless Headphones', description='Test product',
+            price='99.00', category=category, brand='Sonic')
+        self.speaker = Product.objects.create(
+            name='Bluetooth Speaker', description='Test product',
+            price='49.00', category=category, brand='Wireless Co')
+        for product in (self.headphones, self.speaker):
+            self.backend.index_product(product)
+
+    def search(self, value):
+        return list(self.backend.search(Product.objects.all(), value))
+
+    def test_matches_prefixes_like_the_in_process_index(self):
+        self.assertEqual(self.search('head'), [self.headphones])
+        self.assertEqual(self.search('head son'), [self.headphones])
+        self.assertEqual(self.search('headphones speaker'), [])
+
+    def test_ranks_name_matches_above_brand_matches(self):
+        self.assertEqual(self.search('wire'),
+                         [self.headphones, self.speaker])
+
+    def test_ignores_tsquery_operators(self):
+        self.assertEqual(self.search("head:* | !'spea"), [])
+        self.assertEqual(self.search('  '), [])
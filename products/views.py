@@ -1,46 +1,58 @@
-from django.core.cache import cache
 from django.utils.http import urlencode
 import hashlib
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.exceptions import APIException, PermissionDenied
 from django.core.exceptions import ValidationError
-from django.http import Http404
+from django.http import Http404, QueryDict
 from django.db.models import Q
-from core.utils import IsAdminOrReadOnly
+from core.utils import (
+    IsAdminOrReadOnly, ProductPagination, ProductCursorPagination
+)
+from core.parsers import ORJSONParser, MessagePackParser
+from core.cache import (
+    CATALOG, get_cache_generation, invalidate_cache_tags,
+    get_or_compute_entry, attach_validators, conditional_catalog_get
+)
+from .cache import get_product_version
 from .models import Product, ProductImage
 from .serializers import ProductSerializer, ProductImageSerializer
 from .filters import ProductFilter
-from rest_framework.pagination import PageNumberPagination
+from .facets import compute_facets, parse_facets
 
 
-def generate_cache_key(base_key, request):
+def generate_cache_key(base_key, request, params=None):
     """Generate unique cache key from request parameters"""
-    params = urlencode(sorted(request.query_params.items()))
+    if params is None:
+        params = request.query_params
+    params = urlencode(sorted(params.lists()), doseq=True)
     key_hash = hashlib.md5(params.encode()).hexdigest()
-    return f"{base_key}:{key_hash}"
+    generation = get_cache_generation(CATALOG)
+    return f"{base_key}:{generation}:{key_hash}"
+
+
+def product_detail_cache_key(pk):
+    """Generate the detail cache key for a product in the current generation"""
+    generation = get_cache_generation(CATALOG)
+    return f"product_detail:{generation}:{pk}:{get_product_version(pk)}"
 
 
 def invalidate_product_caches():
-    """Invalidate all product-related caches"""
-    cache.delete_pattern("product_list:*")  # Requires redis-py >= 3.0
-    cache.delete_pattern("product_detail:*")
+    """Invalidate all product-related caches by starting a new generation"""
+    invalidate_cache_tags(CATALOG)
 
 
 class ProductListAPIView(APIView):
     permission_classes = [IsAdminOrReadOnly]
-    parser_classes = [MultiPartParser, FormParser, JSONParser]
+    parser_classes = [
+        MultiPartParser, FormParser, ORJSONParser, MessagePackParser
+    ]
 
+    @conditional_catalog_get
     def get(self, request):
         try:
-            cache_key = generate_cache_key("product_list", request)
-            cached_data = cache.get(cache_key)
-
-            if cached_data:
-                return Response(cached_data)
-
             query_params = request.query_params.copy()
 
             # Handle category parameters
@@ -59,7 +71,8 @@ class ProductListAPIView(APIView):
                     del query_params[param]
 
             # Apply filters
-            queryset = Product.objects.all()
+            queryset = Product.objects.select_related(
+                'category').prefetch_related('product_images')
             product_filter = ProductFilter(query_params, queryset=queryset)
 
             if not product_filter.form.is_valid():
@@ -75,18 +88,63 @@ class ProductListAPIView(APIView):
 
             filtered_queryset = product_filter.qs
 
-            # Pagination
-            paginator = PageNumberPagination()
-            paginator.page_size = request.query_params.get('page_size', 10)
-            result_page = paginator.paginate_queryset(
-                filtered_queryset, request)
-            serializer = ProductSerializer(result_page, many=True)
-
-            response_data = serializer.data
+            # Parameters that change the result set rather than its layout
+            filter_params = query_params.copy()
+            for param in ['ordering', 'page', 'page_size']:
+                filter_params.pop(param, None)
+
+            # Facet counts cover the whole filtered set, not just the page
+            facets = None
+            facets_entry = None
+            if request.query_params.get('facets'):
+                try:
+                    facet_names = parse_facets(request.query_params['facets'])
+                except ValueError as e:
+                    return Response({
+                        "success": False,
+                        "message": "Invalid facets.",
+                        "errors": {"facets": [str(e)]}
+                    }, status=status.HTTP_400_BAD_REQUEST)
+
+                facet_params = filter_params.copy()
+                facet_params.setlist('facets', facet_names)
+                facets_cache_key = generate_cache_key(
+                    "product_facets", request, facet_params)
+                facets_entry = get_or_compute_entry(
+                    facets_cache_key,
+                    lambda: compute_facets(filtered_queryset, facet_names),
+                    timeout=900
+                )
+                facets = facets_entry['value']
 
-            cache.set(cache_key, response_data, timeout=900)
-            return paginator.get_paginated_response(response_data)
+            # Pagination
+            if request.query_params.get('pagination') == 'cursor':
+                paginator = ProductCursorPagination()
+            else:
+                paginator = ProductPagination()
+                paginator.count_cache_key = generate_cache_key(
+                    "product_count", request, filter_params)
+
+            def build_page():
+                result_page = paginator.paginate_queryset(
+                    filtered_queryset, request)
+                serializer = ProductSerializer(result_page, many=True)
+                return paginator.get_paginated_response(serializer.data).data
 
+            cache_key = generate_cache_key("product_list", request)
+            page_entry = get_or_compute_entry(
+                cache_key, build_page, timeout=900)
+            response_data = page_entry['value']
+
+            entries = [page_entry]
+            if facets is not None:
+                response_data = {**response_data, "facets": facets}
+                entries.append(facets_entry)
+            return attach_validators(Response(response_data), *entries)
+
+        except APIException:
+            # Such as NotFound for a malformed cursor or an out of range page
+            raise
         except Exception as e:
             return Response({
                 "success": False,
@@ -98,10 +156,11 @@ class ProductListAPIView(APIView):
         if not request.user.is_staff:
             raise PermissionDenied("Only admin users can create products.")
 
-        if request.content_type == 'application/json':
-            data = request.data
-        else:
+        # Form bodies parse to a QueryDict; JSON and MessagePack to a dict
+        if isinstance(request.data, QueryDict):
             data = request.data.dict()
+        else:
+            data = request.data
 
         serializer = ProductSerializer(data=data)
         if serializer.is_valid():
@@ -125,21 +184,19 @@ class ProductDetailAPIView(APIView):
 
     def get_object(self, pk):
         try:
-            return Product.objects.get(pk=pk)
+            return Product.objects.select_related(
+                'category').prefetch_related('product_images').get(pk=pk)
         except Product.DoesNotExist:
             raise Http404
 
+    @conditional_catalog_get
     def get(self, request, pk):
-        cache_key = f"product_detail:{pk}"
-        cached_data = cache.get(cache_key)
-
-        if cached_data:
-            return Response({"success": True, "message": "Product retrieved successfully.", "product": cached_data})
-
-        product = self.get_object(pk)
-        serializer = ProductSerializer(product)
-        cache.set(cache_key, serializer.data, timeout=900)
-        return Response({"success": True, "message": "Product retrieved successfully.", "product": serializer.data})
+        entry = get_or_compute_entry(
+            product_detail_cache_key(pk),
+            lambda: ProductSerializer(self.get_object(pk)).data,
+            timeout=900
+        )
+        return attach_validators(Response({"success": True, "message": "Product retrieved successfully.", "product": entry['value']}), entry)
 
     def patch(self, request, pk):
         product = self.get_object(pk)
@@ -156,7 +213,6 @@ class ProductDetailAPIView(APIView):
 
         if serializer.is_valid():
             serializer.save()
-            cache.delete(f"product_detail:{pk}")
             invalidate_product_caches()
             return Response({
                 "success": True,
@@ -177,7 +233,6 @@ class ProductDetailAPIView(APIView):
             raise PermissionDenied("Only admin users can delete products.")
 
         product.delete()
-        cache.delete(f"product_detail:{pk}")
         invalidate_product_caches()
         return Response({
             "success": True,
@@ -226,7 +281,6 @@ class ProductImageAPIView(APIView):
                 created_images.append(product_image)
 
             serializer = ProductImageSerializer(created_images, many=True)
-            cache.delete(f"product_detail:{product_id}")
             invalidate_product_caches()
 
             return Response({
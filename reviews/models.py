@@ -18,7 +18,9 @@ class Review(models.Model):
         verbose_name = "Review"
         verbose_name_plural = "Reviews"
         indexes = [
-            models.Index(fields=['product']),
+            # A product's reviews in the default newest-first ordering
+            models.Index(fields=['product', '-created_at'],
+                         name='review_product_created_idx'),
             models.Index(fields=['user']),
         ]
         ordering = ['-created_at']
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from core.cache import CATALOG, invalidate_cache_tags
+from .models import Review
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_catalog_caches(sender, **kwargs):
+    invalidate_cache_tags(CATALOG)
@@ -6,11 +6,14 @@ from django.shortcuts import get_object_or_404
 from products.models import Product
 from .models import Review
 from .serializers import ReviewSerializer
+from core.cache import cache_response, conditional_catalog_get
 
 
 class ReviewListView(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    @conditional_catalog_get
+    @cache_response()
     def get(self, request, product_id):
         try:
             reviews = Review.objects.filter(product_id=product_id)
@@ -80,6 +83,8 @@ class ReviewDetailView(APIView):
     def get_object(self, review_id):
         return get_object_or_404(Review, pk=review_id)
 
+    @conditional_catalog_get
+    @cache_response()
     def get(self, request, review_id):
         try:
             review = self.get_object(review_id)